@@ -0,0 +1,810 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+import zlib
+from contextlib import asynccontextmanager, nullcontext
+from collections import OrderedDict, Counter
+from typing import List, Dict, Optional, Generator, AsyncGenerator
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse, FileResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from core_analysis import (
+    run_analysis, run_analysis_file, RelationStore, RelationIndex, ChapterCache, StageProfiler,
+    save_relations_file, load_relations_file, RELATIONS_FILE_SUFFIX, ANALYSIS_STAGES, matcher_cache_info
+)
+
+logger = logging.getLogger(__name__)
+
+# === 서버 설정 ===
+# 동시에 실행하는 분석 작업 수 (큰 책 하나가 나머지 작업을 막지 않도록 여러 슬롯을 둔다)
+JOB_WORKERS = 2
+# 작업 하나가 챕터 분석에 쓰는 프로세스 수 (1이면 작업 스레드 안에서 직렬 처리)
+CHAPTER_WORKERS = 1
+# 대기열 한도: 작업 수와 대기 중인 텍스트 총량(문자 수)
+QUEUE_MAX_JOBS = 16
+QUEUE_MAX_CHARS = 200 * 1024 * 1024
+# 요청 하나의 최대 텍스트 크기(문자 수)
+MAX_TEXT_CHARS = 100 * 1024 * 1024
+# 결과 보관: 열 기반 결과 파일 디렉터리, 완료 후 유지 시간(초)과 전체 결과의 추정 크기 한도(바이트)
+RESULT_DIR = "results"
+RESULT_TTL_SECONDS = 3600
+RESULT_STORE_MAX_BYTES = 512 * 1024 * 1024
+# 대기열이 가득 찼을 때 클라이언트에게 알려 줄 재시도 대기 시간(초)
+RETRY_AFTER_SECONDS = 30
+# 진행 상황 이벤트 스트림(SSE)에서 변화가 없을 때 연결 유지용 주석을 보내는 간격(초)
+SSE_KEEPALIVE_SECONDS = 15
+# 관계 조회 페이지 크기: 기본값과 최대값
+RELATIONS_PAGE_SIZE = 50
+RELATIONS_PAGE_MAX = 1000
+# 챕터별 분석 결과 디스크 캐시 (같은 책을 조금 고쳐 다시 보내면 바뀐 챕터만 분석)
+CHAPTER_CACHE_DIR = "chapter_cache"
+CHAPTER_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# 업로드된 본문 저장소: 내용 해시 이름으로 보관해 같은 책은 다시 올리지 않는다
+TEXT_STORE_DIR = "uploads"
+TEXT_STORE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# 업로드 한도: 본문 하나(UTF-8 바이트)와 압축을 푼 청크 하나의 최대 크기
+MAX_UPLOAD_BYTES = 300 * 1024 * 1024
+UPLOAD_CHUNK_MAX_BYTES = 16 * 1024 * 1024
+# 끝나지 않은 업로드 조각을 남겨 두는 시간(초) - 그 안에는 이어서 올릴 수 있다
+UPLOAD_PART_TTL_SECONDS = 24 * 3600
+# 작업마다 분석 단계별 시간을 재서 진행 상황과 /metrics에 싣는다 (끄면 시간을 재지 않는다)
+STAGE_PROFILING = True
+# 관계를 찾는 문장 창의 최대 크기 (1이면 문장 단위, 창이 클수록 관계 수가 늘어난다)
+MAX_SENTENCE_WINDOW = 10
+
+_TEXT_HASH = re.compile(r'[0-9a-f]{64}')
+
+class AnalyzeRequest(BaseModel):
+    # 본문을 직접 보내거나(text), 미리 업로드한 본문의 sha256 해시(text_hash)를 보낸다
+    text: Optional[str] = None
+    text_hash: Optional[str] = None
+    characters: List[str]
+    emotion_lexicon: Dict[str, List[str]]
+    chapter_pattern: str = r"(Letter \d+|Chapter \d+)"
+    # 연속한 몇 문장 안에 함께 나온 인물·감정어를 관계로 볼지 (1이면 같은 문장 안에서만)
+    sentence_window: int = 1
+
+class QueueFullError(Exception):
+    """대기열 한도를 넘는 요청 (클라이언트는 잠시 후 재시도)"""
+
+class JobCancelled(Exception):
+    """실행 중 취소 요청을 받은 작업"""
+
+class UploadOffsetError(Exception):
+    """업로드 청크의 위치가 서버가 지금까지 받은 크기와 다름 (클라이언트는 received부터 다시 보낸다)"""
+
+    def __init__(self, received: int):
+        super().__init__(received)
+        self.received = received
+
+# === 작업 상태 ===
+class Job:
+    def __init__(self, request: AnalyzeRequest, text_chars: int):
+        self.task_id = uuid.uuid4().hex
+        self.request: Optional[AnalyzeRequest] = request
+        self.text_chars = text_chars
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = "대기 중..."
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.profiler: Optional[StageProfiler] = StageProfiler() if STAGE_PROFILING else None
+        self.cancel_event = threading.Event()
+        self.last_progress: Dict = {}
+        # 진행 상황 구독자: (이벤트 루프, asyncio.Event) - 작업 스레드에서 깨운다
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    def on_progress(self, info: Dict):
+        """ProgressTracker.update 결과를 받아 상태 갱신 (취소 요청 시 중단)"""
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+        self.progress = info["progress"]
+        # 파일 입력은 챕터 수를 미리 세지 않으므로 total이 None일 수 있다
+        total = info["total"] if info["total"] is not None else "?"
+        self.message = (f"{info['chapter']} 완료 ({info['processed']}/{total}, 관계 {info['relations']}개, "
+                        f"{info['mb_per_s']:.2f}MB/s, 남은 시간 약 {info['eta_seconds']:.0f}초)")
+        self.last_progress = info
+        self.publish()
+
+    def snapshot(self) -> Dict:
+        return {
+            "task_id": self.task_id,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            **{key: value for key, value in self.last_progress.items() if key != "progress"},
+            **({"stages": self.profiler.snapshot()} if self.profiler is not None and self.done else {})
+        }
+
+    def subscribe(self) -> asyncio.Event:
+        """상태가 바뀔 때마다 set되는 이벤트 등록 (중간 상태는 합쳐지고 최신 상태만 전달)"""
+        changed = asyncio.Event()
+        with self._subscribers_lock:
+            self._subscribers.append((asyncio.get_running_loop(), changed))
+        return changed
+
+    def unsubscribe(self, changed: asyncio.Event):
+        with self._subscribers_lock:
+            self._subscribers = [(loop, event) for loop, event in self._subscribers if event is not changed]
+
+    def publish(self):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for loop, changed in subscribers:
+            try:
+                loop.call_soon_threadsafe(changed.set)
+            except RuntimeError:
+                pass  # 이미 닫힌 이벤트 루프
+
+# === 결과 저장소 ===
+def _estimate_result_bytes(result: Dict) -> int:
+    """결과의 대략적인 크기 (메모리 맵 결과 파일 + 조회 색인 + 요약)"""
+    relations: RelationStore = result["relations"]
+    size = os.path.getsize(relations.path)
+    size += len(relations) * 3 * 4
+    size += len(result["summary_relations"]) * 200
+    return size
+
+class ResultStore:
+    """완료된 분석 결과를 TTL과 전체 크기 한도 안에서 보관 (오래된 것부터 제거)
+
+    결과는 내용 해시 이름의 열 기반 파일로 저장해 메모리 맵으로 열어 두고,
+    같은 내용의 결과는 파일 하나를 공유한다. 마지막 결과가 제거될 때 파일도 지운다.
+    """
+
+    def __init__(self, directory: str = RESULT_DIR, ttl_seconds: int = RESULT_TTL_SECONDS,
+                 max_bytes: int = RESULT_STORE_MAX_BYTES):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # task_id -> (저장 시각, 크기, 결과)
+        self._lock = threading.Lock()
+        # 이전 실행에서 남은 결과 파일은 참조하는 작업이 없으므로 정리
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.endswith((RELATIONS_FILE_SUFFIX, ".tmp")):
+                os.remove(os.path.join(directory, name))
+
+    def save(self, task_id: str, result: Dict) -> Dict:
+        """compact 결과를 파일로 쓰고 메모리 맵으로 다시 열어 보관 (조회 색인 포함)"""
+        mapped = load_relations_file(save_relations_file(result, self.directory))
+        mapped["index"] = RelationIndex(mapped["relations"])
+        self.put(task_id, mapped)
+        return mapped
+
+    def put(self, task_id: str, result: Dict):
+        size = _estimate_result_bytes(result)
+        with self._lock:
+            self._entries[task_id] = (time.time(), size, result)
+            self.total_bytes += size
+            self._evict()
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        with self._lock:
+            self._evict()
+            entry = self._entries.get(task_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(task_id)
+            return entry[2]
+
+    def discard(self, task_id: str):
+        with self._lock:
+            entry = self._entries.pop(task_id, None)
+            if entry is not None:
+                self._drop(entry)
+
+    def _drop(self, entry):
+        # 잠금을 가진 상태에서 호출: 같은 파일을 쓰는 다른 결과가 없으면 파일 삭제
+        _, size, result = entry
+        self.total_bytes -= size
+        path = result["relations"].path
+        if not any(other["relations"].path == path for _, _, other in self._entries.values()):
+            try:
+                os.remove(path)  # 이미 연 메모리 맵은 닫힐 때까지 유효하다
+            except OSError:
+                pass
+
+    def _evict(self):
+        now = time.time()
+        # 만료된 결과 제거 후, 크기 한도를 넘으면 가장 오래 사용하지 않은 결과부터 제거
+        for task_id in [k for k, (stored_at, _, _) in self._entries.items() if now - stored_at > self.ttl_seconds]:
+            self._drop(self._entries.pop(task_id))
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            task_id, entry = self._entries.popitem(last=False)
+            self._drop(entry)
+            logger.info(f"결과 저장소 한도 초과로 결과 제거: {task_id}")
+
+# === 업로드된 본문 저장소 ===
+class TextStore:
+    """업로드된 본문을 sha256 해시 이름의 UTF-8 파일로 보관
+
+    청크는 순서대로 `<해시>.part`에 이어 붙이고, 완료 요청 때 해시를 검증한 뒤
+    `<해시>.txt`로 바꾼다. 대기/실행 중인 작업이 쓰는 본문은 고정(pin)되어 지워지지 않고,
+    나머지는 전체 크기가 한도를 넘으면 가장 오래 사용하지 않은 것부터 지운다.
+    """
+
+    def __init__(self, directory: str = TEXT_STORE_DIR, max_bytes: int = TEXT_STORE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._pins = Counter()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, text_hash: str) -> str:
+        return os.path.join(self.directory, text_hash + ".txt")
+
+    def _part_path(self, text_hash: str) -> str:
+        return os.path.join(self.directory, text_hash + ".part")
+
+    def state(self, text_hash: str) -> Dict:
+        """업로드 상태: 완료 여부와 지금까지 받은 바이트 수 (이어 올리기 위치)"""
+        with self._lock:
+            if os.path.exists(self.path(text_hash)):
+                return {"hash": text_hash, "complete": True, "received": os.path.getsize(self.path(text_hash))}
+            part_path = self._part_path(text_hash)
+            received = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            return {"hash": text_hash, "complete": False, "received": received}
+
+    def append(self, text_hash: str, offset: int, data: bytes) -> int:
+        """offset 위치에 청크를 이어 붙이고 받은 전체 바이트 수를 반환"""
+        with self._lock:
+            if os.path.exists(self.path(text_hash)):
+                return os.path.getsize(self.path(text_hash))  # 다른 클라이언트가 이미 완료한 본문
+            part_path = self._part_path(text_hash)
+            received = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if offset != received:
+                raise UploadOffsetError(received)
+            if received + len(data) > MAX_UPLOAD_BYTES:
+                raise ValueError(f"본문이 너무 큽니다. (최대 {MAX_UPLOAD_BYTES / (1024 * 1024):.0f}MB)")
+            if received == 0:
+                self._prune_parts()
+            with open(part_path, "ab") as f:
+                f.write(data)
+            return received + len(data)
+
+    def complete(self, text_hash: str) -> int:
+        """받은 조각의 해시를 검증해 본문으로 확정하고 크기를 반환 (해시가 다르면 조각 삭제)"""
+        if os.path.exists(self.path(text_hash)):
+            return os.path.getsize(self.path(text_hash))
+        part_path = self._part_path(text_hash)
+        digest = hashlib.sha256()
+        with open(part_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        with self._lock:
+            if digest.hexdigest() != text_hash:
+                os.remove(part_path)
+                raise ValueError("업로드된 내용의 해시가 일치하지 않습니다. 처음부터 다시 올려 주세요.")
+            os.replace(part_path, self.path(text_hash))
+            self._evict()
+            return os.path.getsize(self.path(text_hash))
+
+    def acquire(self, text_hash: str) -> Optional[int]:
+        """작업이 끝날 때까지 본문을 고정하고 크기를 반환 (없으면 None)"""
+        with self._lock:
+            path = self.path(text_hash)
+            if not os.path.exists(path):
+                return None
+            os.utime(path)  # LRU 순서 갱신
+            self._pins[text_hash] += 1
+            return os.path.getsize(path)
+
+    def release(self, text_hash: str):
+        with self._lock:
+            self._pins[text_hash] -= 1
+            if self._pins[text_hash] <= 0:
+                del self._pins[text_hash]
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(size for _, _, size, _ in self._entries())
+
+    def _entries(self) -> List:
+        # 잠금을 가진 상태에서 호출: (수정 시각, 경로, 크기, 해시) 목록
+        entries = []
+        for name in os.listdir(self.directory):
+            text_hash, ext = os.path.splitext(name)
+            if ext in (".txt", ".part"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, os.path.join(self.directory, name), stat.st_size, text_hash))
+        return entries
+
+    def _prune_parts(self):
+        # 잠금을 가진 상태에서 호출: 오래 방치된 업로드 조각 제거
+        now = time.time()
+        for mtime, path, _, _ in self._entries():
+            if path.endswith(".part") and now - mtime > UPLOAD_PART_TTL_SECONDS:
+                os.remove(path)
+
+    def _evict(self):
+        # 잠금을 가진 상태에서 호출
+        entries = sorted(entry for entry in self._entries() if entry[1].endswith(".txt"))
+        total = sum(size for _, _, size, _ in entries)
+        for _, path, size, text_hash in entries:
+            if total <= self.max_bytes:
+                break
+            if self._pins[text_hash] > 0:
+                continue
+            os.remove(path)
+            total -= size
+            logger.info(f"본문 저장소 한도 초과로 본문 제거: {text_hash}")
+
+# === 작업 관리자 ===
+class JobManager:
+    """고정된 수의 작업 스레드와 한도가 있는 대기열로 분석 작업을 실행"""
+
+    def __init__(self, result_store: ResultStore, chapter_cache: ChapterCache, text_store: TextStore,
+                 workers: int = JOB_WORKERS, max_jobs: int = QUEUE_MAX_JOBS, max_chars: int = QUEUE_MAX_CHARS):
+        self.result_store = result_store
+        self.chapter_cache = chapter_cache
+        self.text_store = text_store
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.max_chars = max_chars
+        self.queued_jobs = 0
+        self.queued_chars = 0
+        self._jobs: Dict[str, Job] = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        # /metrics 누적값: 끝난 작업 수(상태별), 분석한 문자 수와 시간, 단계별 시간
+        self.finished_jobs = Counter()
+        self.analyzed_chars = 0
+        self.analysis_seconds = 0.0
+        self.stage_seconds = Counter()
+
+    def start(self):
+        for i in range(self.workers - len(self._threads)):
+            thread = threading.Thread(target=self._worker_loop, name=f"analysis-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, request: AnalyzeRequest, text_chars: int) -> Job:
+        job = Job(request, text_chars)
+        with self._lock:
+            self._prune()
+            # 대기열이 가득 차면 받지 않고 재시도를 요청 (메모리 무한 증가 방지)
+            if self.queued_jobs >= self.max_jobs or self.queued_chars + job.text_chars > self.max_chars:
+                raise QueueFullError()
+            self.queued_jobs += 1
+            self.queued_chars += job.text_chars
+            self._jobs[job.task_id] = job
+        self._queue.put(job)
+        logger.info(f"작업 접수: {job.task_id} ({job.text_chars / (1024 * 1024):.2f}MB)")
+        return job
+
+    def get(self, task_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(task_id)
+
+    def cancel(self, task_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(task_id)
+            if job is None or job.done:
+                return job
+            job.cancel_event.set()
+            if job.status == "queued":
+                # 대기 중인 작업은 바로 취소 (작업 스레드는 꺼낸 뒤 건너뛴다)
+                self._release(job)
+                self._finish(job, "cancelled", "사용자 요청으로 취소되었습니다.")
+            else:
+                job.message = "취소 요청됨..."
+        return job
+
+    def stats(self) -> Dict:
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == "running")
+            return {
+                "workers": self.workers,
+                "running": running,
+                "queued": self.queued_jobs,
+                "queued_chars": self.queued_chars,
+                "stored_results_bytes": self.result_store.total_bytes,
+                "uploaded_texts_bytes": self.text_store.total_bytes(),
+                "chapter_cache": self.chapter_cache.info(),
+                "matcher_cache": matcher_cache_info()
+            }
+
+    def _release(self, job: Job):
+        # 잠금을 가진 상태에서 호출
+        self.queued_jobs -= 1
+        self.queued_chars -= job.text_chars
+
+    def metrics(self) -> Dict:
+        """Prometheus 지표용 현재 값과 누적값"""
+        with self._lock:
+            statuses = Counter(job.status for job in self._jobs.values())
+            throughput = sum(job.last_progress.get("mb_per_s", 0.0) for job in self._jobs.values() if job.status == "running")
+            return {
+                "jobs": statuses,
+                "finished_jobs": Counter(self.finished_jobs),
+                "queued_chars": self.queued_chars,
+                "running_mb_per_s": throughput,
+                "analyzed_chars": self.analyzed_chars,
+                "analysis_seconds": self.analysis_seconds,
+                "stage_seconds": Counter(self.stage_seconds),
+                "stored_results_bytes": self.result_store.total_bytes,
+                "uploaded_texts_bytes": self.text_store.total_bytes(),
+                "chapter_cache": self.chapter_cache.info(),
+                "matcher_cache": matcher_cache_info()
+            }
+
+    def _finish(self, job: Job, status: str, message: str):
+        # 잠금을 가진 상태에서 호출
+        job.status = status
+        job.message = message
+        job.finished_at = time.time()
+        self.finished_jobs[status] += 1
+        if status == "completed":
+            self.analyzed_chars += job.text_chars
+        if job.started_at is not None:
+            self.analysis_seconds += job.finished_at - job.started_at
+        if job.profiler is not None:
+            self.stage_seconds.update(job.profiler.seconds)
+        if job.request is not None and job.request.text_hash is not None:
+            self.text_store.release(job.request.text_hash)
+        job.request = None  # 원문 텍스트 해제
+        job.publish()
+
+    def _prune(self):
+        # 잠금을 가진 상태에서 호출: 보관 기간이 지난 완료 작업 기록 제거
+        now = time.time()
+        expired = [task_id for task_id, job in self._jobs.items()
+                   if job.done and now - job.finished_at > self.result_store.ttl_seconds]
+        for task_id in expired:
+            del self._jobs[task_id]
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.status != "queued":
+                    continue  # 대기 중에 취소된 작업
+                self._release(job)
+                job.status = "running"
+                job.message = "분석 중..."
+                job.started_at = time.time()
+            job.publish()
+            self._run(job)
+
+    def _run(self, job: Job):
+        request = job.request
+        options = dict(progress_callback=job.on_progress, workers=CHAPTER_WORKERS, compact=True,
+                       cache=self.chapter_cache, profiler=job.profiler, window=request.sentence_window)
+        try:
+            if request.text_hash is None:
+                result = run_analysis(request.text, request.characters, request.emotion_lexicon,
+                                      request.chapter_pattern, **options)
+            else:
+                # 업로드된 본문은 파일에서 챕터 단위로 읽어 한꺼번에 메모리에 올리지 않는다
+                result = run_analysis_file(self.text_store.path(request.text_hash), request.characters,
+                                           request.emotion_lexicon, request.chapter_pattern,
+                                           encoding="utf-8", **options)
+            # 결과 파일 저장과 쌍/챕터/감정어 조회 색인 생성은 작업 스레드에서 미리 해 둔다
+            with job.profiler.stage("serialization") if job.profiler is not None else nullcontext():
+                result = self.result_store.save(job.task_id, result)
+            with self._lock:
+                job.progress = 100.0
+                self._finish(job, "completed", f"분석 완료: 관계 {len(result['relations'])}개")
+        except JobCancelled:
+            with self._lock:
+                self._finish(job, "cancelled", "사용자 요청으로 취소되었습니다.")
+            logger.info(f"작업 취소: {job.task_id}")
+        except Exception as e:
+            with self._lock:
+                self._finish(job, "failed", str(e))
+            logger.error(f"작업 실패: {job.task_id} - {str(e)}")
+
+def _iter_result_json(result: Dict, batch_size: int = 1000) -> Generator[str, None, None]:
+    """압축 저장된 결과를 한 번에 dict 목록으로 만들지 않고 JSON으로 흘려보냄"""
+    relations: RelationStore = result["relations"]
+    yield '{"relations": ['
+    for start in range(0, len(relations), batch_size):
+        rows = (json.dumps(relations[i], ensure_ascii=False) for i in range(start, min(start + batch_size, len(relations))))
+        yield ("," if start else "") + ",".join(rows)
+    yield '], "chapter_emotions": ' + json.dumps(result["chapter_emotions"], ensure_ascii=False)
+    yield ', "summary_relations": ' + json.dumps(result["summary_relations"], ensure_ascii=False)
+    for key in ("chapter_emotion_matrix", "emotion_balance"):
+        if key in result:
+            yield f', "{key}": ' + json.dumps(result[key], ensure_ascii=False)
+    yield '}'
+
+def _iter_relations_csv(relations: RelationStore, rows: List[int], batch_size: int = 1000) -> Generator[str, None, None]:
+    """조회 결과 행을 CSV로 흘려보냄 (엑셀에서 한글이 깨지지 않도록 BOM 포함)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(["from", "to", "attitude", "sentence", "chapter"])
+    for start in range(0, len(rows), batch_size):
+        for row in rows[start:start + batch_size]:
+            relation = relations[row]
+            writer.writerow([relation["from"], relation["to"], relation["attitude"], relation["sentence"], relation["chapter"]])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+# === API ===
+result_store = ResultStore()
+chapter_cache = ChapterCache(CHAPTER_CACHE_DIR, CHAPTER_CACHE_MAX_BYTES)
+text_store = TextStore()
+job_manager = JobManager(result_store, chapter_cache, text_store)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_manager.start()
+    yield
+
+app = FastAPI(title="문학 텍스트 감정·관계 분석 API", lifespan=lifespan)
+
+def _get_job(task_id: str) -> Job:
+    job = job_manager.get(task_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다.")
+    return job
+
+def _get_result(task_id: str) -> Dict:
+    job = _get_job(task_id)
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"작업이 완료되지 않았습니다. (상태: {job.status})")
+    result = result_store.get(task_id)
+    if result is None:
+        raise HTTPException(status_code=410, detail="결과 보관 기간이 지나 삭제되었습니다.")
+    return result
+
+def _check_text_hash(text_hash: str):
+    if not _TEXT_HASH.fullmatch(text_hash):
+        raise HTTPException(status_code=400, detail="본문 해시는 소문자 16진수 sha256이어야 합니다.")
+
+def _decompress_chunk(body: bytes, content_encoding: str) -> bytes:
+    """gzip 청크 압축 해제 (압축 폭탄을 막기 위해 풀린 크기를 제한)"""
+    if content_encoding != "gzip":
+        data = body
+    else:
+        decompressor = zlib.decompressobj(wbits=31)
+        try:
+            data = decompressor.decompress(body, UPLOAD_CHUNK_MAX_BYTES + 1)
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="gzip 압축을 풀 수 없는 청크입니다.")
+        if decompressor.unconsumed_tail or not decompressor.eof:
+            raise HTTPException(status_code=413, detail="청크가 너무 크거나 잘렸습니다.")
+    if len(data) > UPLOAD_CHUNK_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"청크가 너무 큽니다. (최대 {UPLOAD_CHUNK_MAX_BYTES / (1024 * 1024):.0f}MB)")
+    return data
+
+@app.get("/texts/{text_hash}")
+def get_text_state(text_hash: str):
+    _check_text_hash(text_hash)
+    return text_store.state(text_hash)
+
+@app.put("/texts/{text_hash}/chunks")
+async def upload_text_chunk(text_hash: str, offset: int, request: Request):
+    _check_text_hash(text_hash)
+    data = _decompress_chunk(await request.body(), request.headers.get("content-encoding", "identity"))
+    try:
+        received = await run_in_threadpool(text_store.append, text_hash, offset, data)
+    except UploadOffsetError as e:
+        raise HTTPException(status_code=409, detail={"message": "업로드 위치가 맞지 않습니다.", "received": e.received})
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return {"hash": text_hash, "complete": False, "received": received}
+
+@app.post("/texts/{text_hash}/complete")
+def complete_text_upload(text_hash: str):
+    _check_text_hash(text_hash)
+    try:
+        size = text_store.complete(text_hash)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="업로드 중인 본문이 없습니다.")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"hash": text_hash, "complete": True, "received": size}
+
+@app.post("/analyze", status_code=202)
+def analyze(request: AnalyzeRequest):
+    if (request.text is None) == (request.text_hash is None):
+        raise HTTPException(status_code=422, detail="text와 text_hash 중 하나만 보내야 합니다.")
+    if not 1 <= request.sentence_window <= MAX_SENTENCE_WINDOW:
+        raise HTTPException(status_code=422, detail=f"sentence_window는 1에서 {MAX_SENTENCE_WINDOW} 사이여야 합니다.")
+    if request.text_hash is not None:
+        _check_text_hash(request.text_hash)
+        text_chars = text_store.acquire(request.text_hash)
+        if text_chars is None:
+            raise HTTPException(status_code=404, detail="업로드된 본문을 찾을 수 없습니다. 다시 업로드해 주세요.")
+    else:
+        text_chars = len(request.text)
+        if text_chars > MAX_TEXT_CHARS:
+            raise HTTPException(status_code=413, detail=f"텍스트가 너무 큽니다. (최대 {MAX_TEXT_CHARS / (1024 * 1024):.0f}MB)")
+    try:
+        job = job_manager.submit(request, text_chars)
+    except QueueFullError:
+        if request.text_hash is not None:
+            text_store.release(request.text_hash)
+        raise HTTPException(
+            status_code=503,
+            detail="대기 중인 작업이 너무 많습니다. 잠시 후 다시 시도해 주세요.",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+    return job.snapshot()
+
+@app.get("/tasks/{task_id}")
+def get_task(task_id: str):
+    return _get_job(task_id).snapshot()
+
+async def _iter_task_events(job: Job) -> AsyncGenerator[str, None]:
+    """작업 상태가 바뀔 때마다 SSE 이벤트 전송, 끝난 작업이면 마지막 상태를 보내고 종료"""
+    changed = job.subscribe()
+    try:
+        yield f"data: {json.dumps(job.snapshot(), ensure_ascii=False)}\n\n"
+        while not job.done:
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            changed.clear()
+            yield f"data: {json.dumps(job.snapshot(), ensure_ascii=False)}\n\n"
+    finally:
+        job.unsubscribe(changed)
+
+@app.get("/tasks/{task_id}/events")
+async def task_events(task_id: str):
+    job = _get_job(task_id)
+    return StreamingResponse(
+        _iter_task_events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/tasks/{task_id}")
+def cancel_task(task_id: str):
+    _get_job(task_id)
+    return job_manager.cancel(task_id).snapshot()
+
+@app.get("/results/{task_id}")
+def get_result(task_id: str):
+    return StreamingResponse(_iter_result_json(_get_result(task_id)), media_type="application/json")
+
+def _query_rows(result: Dict, source: Optional[str], target: Optional[str], attitude: Optional[str],
+                chapter: Optional[str], sort: str, order: str) -> List[int]:
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order는 asc 또는 desc여야 합니다.")
+    try:
+        return result["index"].rows(source, target, attitude, chapter, sort, descending=(order == "desc"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/results/{task_id}/relations.rel")
+def download_relations_file(task_id: str):
+    """열 기반 결과 파일 원본 (core_analysis.load_relations_file로 메모리 맵해 사용)"""
+    path = _get_result(task_id)["relations"].path
+    return FileResponse(path, media_type="application/octet-stream", filename=os.path.basename(path))
+
+@app.get("/results/{task_id}/summary")
+def get_result_summary(task_id: str):
+    """관계 목록을 뺀 결과 (그래프·챕터별 감정 표와 조회 필터 선택지용)"""
+    result = _get_result(task_id)
+    relations: RelationStore = result["relations"]
+    return {
+        "relations_count": len(relations),
+        "characters": relations.characters,
+        "emotions": relations.emotions,
+        "chapters": relations.chapters,
+        "chapter_emotions": result["chapter_emotions"],
+        "summary_relations": result["summary_relations"],
+        "chapter_emotion_matrix": result.get("chapter_emotion_matrix"),
+        "emotion_balance": result.get("emotion_balance", [])
+    }
+
+@app.get("/results/{task_id}/relations")
+def query_relations(
+    task_id: str,
+    source: Optional[str] = Query(None, alias="from"),
+    target: Optional[str] = Query(None, alias="to"),
+    attitude: Optional[str] = None,
+    chapter: Optional[str] = None,
+    sort: str = "order",
+    order: str = "asc",
+    offset: int = Query(0, ge=0),
+    limit: int = Query(RELATIONS_PAGE_SIZE, ge=1, le=RELATIONS_PAGE_MAX)
+):
+    """필터·정렬한 관계 중 한 페이지만 반환"""
+    result = _get_result(task_id)
+    rows = _query_rows(result, source, target, attitude, chapter, sort, order)
+    return {"total": len(rows), "offset": offset, "limit": limit, "rows": result["index"].page(rows, offset, limit)}
+
+@app.get("/results/{task_id}/relations.csv")
+def export_relations_csv(
+    task_id: str,
+    source: Optional[str] = Query(None, alias="from"),
+    target: Optional[str] = Query(None, alias="to"),
+    attitude: Optional[str] = None,
+    chapter: Optional[str] = None,
+    sort: str = "order",
+    order: str = "asc"
+):
+    """같은 필터·정렬의 관계 전체를 CSV로 스트리밍"""
+    result = _get_result(task_id)
+    rows = _query_rows(result, source, target, attitude, chapter, sort, order)
+    return StreamingResponse(
+        _iter_relations_csv(result["relations"], rows),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="relations_{task_id}.csv"'}
+    )
+
+@app.get("/health")
+def health():
+    return job_manager.stats()
+
+def _prometheus_metric(name: str, kind: str, help_text: str, samples) -> List[str]:
+    """지표 하나의 Prometheus 텍스트 형식 줄 (samples: (라벨 dict, 값) 목록)"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return lines
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus 텍스트 형식 지표 (작업 수, 처리량, 분석 단계별 누적 시간, 저장소 크기)"""
+    values = job_manager.metrics()
+    cache_info = values["chapter_cache"]
+    matcher_info = values["matcher_cache"]
+    lines = []
+    lines += _prometheus_metric("literature_jobs", "gauge", "상태별 현재 작업 수",
+                                [({"status": status}, values["jobs"][status])
+                                 for status in ("queued", "running", "completed", "failed", "cancelled")])
+    lines += _prometheus_metric("literature_jobs_finished_total", "counter", "서버 시작 후 끝난 작업 수 (상태별)",
+                                [({"status": status}, values["finished_jobs"][status]) for status in ("completed", "failed", "cancelled")])
+    lines += _prometheus_metric("literature_queued_chars", "gauge", "대기열에 있는 텍스트 총량 (문자 수)",
+                                [({}, values["queued_chars"])])
+    lines += _prometheus_metric("literature_running_throughput_mb_per_second", "gauge", "실행 중인 작업들의 현재 처리 속도 합 (MB/s)",
+                                [({}, round(values["running_mb_per_s"], 3))])
+    lines += _prometheus_metric("literature_analyzed_chars_total", "counter", "완료된 작업이 분석한 텍스트 총량 (문자 수)",
+                                [({}, values["analyzed_chars"])])
+    lines += _prometheus_metric("literature_analysis_seconds_total", "counter", "작업 실행에 걸린 시간 합 (초)",
+                                [({}, round(values["analysis_seconds"], 6))])
+    lines += _prometheus_metric("literature_stage_seconds_total", "counter", "끝난 작업의 분석 단계별 시간 합 (초)",
+                                [({"stage": stage}, round(values["stage_seconds"][stage], 6)) for stage in ANALYSIS_STAGES])
+    lines += _prometheus_metric("literature_stored_results_bytes", "gauge", "보관 중인 결과의 추정 크기 (바이트)",
+                                [({}, values["stored_results_bytes"])])
+    lines += _prometheus_metric("literature_uploaded_texts_bytes", "gauge", "업로드된 본문의 디스크 크기 (바이트)",
+                                [({}, values["uploaded_texts_bytes"])])
+    lines += _prometheus_metric("literature_chapter_cache_hits_total", "counter", "챕터 캐시 적중 수",
+                                [({}, cache_info["hits"])])
+    lines += _prometheus_metric("literature_chapter_cache_misses_total", "counter", "챕터 캐시 실패 수",
+                                [({}, cache_info["misses"])])
+    lines += _prometheus_metric("literature_chapter_cache_bytes", "gauge", "챕터 캐시의 디스크 크기 (바이트)",
+                                [({}, cache_info["bytes"])])
+    lines += _prometheus_metric("literature_matcher_cache_hits_total", "counter", "컴파일된 어휘 매처 캐시 적중 수",
+                                [({}, matcher_info["hits"])])
+    lines += _prometheus_metric("literature_matcher_cache_misses_total", "counter", "컴파일된 어휘 매처 캐시 실패 수",
+                                [({}, matcher_info["misses"])])
+    lines += _prometheus_metric("literature_matcher_cache_entries", "gauge", "컴파일된 어휘 매처 캐시 항목 수",
+                                [({}, matcher_info["size"])])
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=8000)
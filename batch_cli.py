@@ -0,0 +1,338 @@
+"""여러 책을 한 번에 분석하는 배치 명령
+
+디렉터리(하위 디렉터리 포함)의 .txt 파일이나 매니페스트(JSON Lines)에 적힌 책들을
+프로세스 풀에서 책 단위로 나눠 분석하고, 책마다 결과를 NDJSON 파일 하나로 기록한다.
+끝난 책은 출력 디렉터리의 체크포인트 파일에 한 줄씩 남기므로 중단된 실행을 다시
+시작하면 끝난 책은 건너뛰고 나머지만 분석한다.
+
+    python batch_cli.py books/ out/ --workers 4
+    python batch_cli.py books.jsonl out/ --workers 4
+
+디렉터리 입력에서 책 `name.txt`의 등장인물과 감정어 사전은 다음 순서로 찾는다.
+  1. 같은 위치의 `name.characters.txt` / `name.lexicon.json`
+  2. 같은 디렉터리나 상위 디렉터리(입력 디렉터리까지)의 `characters.txt` / `attitude_lexicon.json`
+  3. --characters / --lexicon 옵션
+매니페스트는 한 줄에 책 하나: {"text": 경로, "characters": 경로 또는 목록, "lexicon": 경로 또는 사전,
+"id": 출력 이름(선택), "chapter_pattern": 정규식(선택), "window": 문장 창 크기(선택)}.
+상대 경로는 매니페스트 위치 기준이다. id가 없으면 본문 경로에서 '..'와 앞의 '/'를 뺀 경로(확장자 제외)를
+쓰며, 출력 디렉터리 밖을 가리키는 id는 거부한다.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Optional, Iterable
+
+import core_analysis
+from core_analysis import iter_analysis_file, write_ndjson, read_text_file
+
+logger = logging.getLogger(__name__)
+
+# 출력 디렉터리에 남기는 체크포인트 파일 (끝난 책마다 한 줄, 추가 쓰기만 하므로 중단되어도 안전)
+CHECKPOINT_FILE = "checkpoint.jsonl"
+CHARACTERS_FILE = "characters.txt"
+LEXICON_FILE = "attitude_lexicon.json"
+BOOK_CHARACTERS_SUFFIX = ".characters.txt"
+BOOK_LEXICON_SUFFIX = ".lexicon.json"
+OUTPUT_SUFFIX = ".ndjson"
+DEFAULT_CHAPTER_PATTERN = r"(Letter \d+|Chapter \d+)"
+
+# === 책 목록 ===
+def _nearest_file(directory: str, root: str, name: str) -> Optional[str]:
+    """directory부터 root까지 올라가며 처음 찾은 name 파일"""
+    directory = os.path.abspath(directory)
+    root = os.path.abspath(root)
+    while True:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+        if directory == root or os.path.dirname(directory) == directory:
+            return None
+        directory = os.path.dirname(directory)
+
+def scan_directory(root: str, characters: Optional[str] = None, lexicon: Optional[str] = None,
+                   chapter_pattern: str = DEFAULT_CHAPTER_PATTERN, window: int = 1) -> List[Dict]:
+    """디렉터리의 책(.txt) 목록 (등장인물·감정어 사전 파일은 책에서 제외)"""
+    books = []
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if not name.endswith(".txt") or name == CHARACTERS_FILE or name.endswith(BOOK_CHARACTERS_SUFFIX):
+                continue
+            path = os.path.join(directory, name)
+            stem = path[:-len(".txt")]
+            book_characters = stem + BOOK_CHARACTERS_SUFFIX
+            book_lexicon = stem + BOOK_LEXICON_SUFFIX
+            books.append({
+                "id": os.path.relpath(stem, root).replace(os.sep, "/"),
+                "text": path,
+                "characters": book_characters if os.path.isfile(book_characters)
+                              else _nearest_file(directory, root, CHARACTERS_FILE) or characters,
+                "lexicon": book_lexicon if os.path.isfile(book_lexicon)
+                           else _nearest_file(directory, root, LEXICON_FILE) or lexicon,
+                "chapter_pattern": chapter_pattern,
+                "window": window
+            })
+    return books
+
+def _manifest_id(text: str) -> str:
+    """매니페스트 본문 경로로 만든 기본 id ('..', '.', 앞의 '/'를 뺀 정규화 경로, 확장자 제외)"""
+    stem = os.path.splitext(os.path.normpath(text))[0].replace(os.sep, "/")
+    return "/".join(part for part in stem.split("/") if part not in ("", ".", ".."))
+
+def _is_safe_id(book_id: str) -> bool:
+    """출력 디렉터리 안의 상대 경로를 가리키는 id인지"""
+    if not book_id or os.path.isabs(book_id) or os.path.splitdrive(book_id)[0]:
+        return False
+    normalized = posixpath.normpath(book_id.replace("\\", "/"))
+    return normalized not in (".", "..") and not normalized.startswith(("../", "/"))
+
+def read_manifest(path: str, characters: Optional[str] = None, lexicon: Optional[str] = None,
+                  chapter_pattern: str = DEFAULT_CHAPTER_PATTERN, window: int = 1) -> List[Dict]:
+    """매니페스트(JSON Lines)의 책 목록"""
+    base = os.path.dirname(os.path.abspath(path))
+
+    def resolve(value):
+        return os.path.join(base, value) if isinstance(value, str) else value
+
+    books = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "text" not in entry:
+                raise ValueError(f"{path}:{line_no}: 'text' 항목이 없습니다.")
+            text = resolve(entry["text"])
+            book_id = entry.get("id") or _manifest_id(entry["text"])
+            if not _is_safe_id(book_id):
+                raise ValueError(f"{path}:{line_no}: 출력 디렉터리 밖을 가리키는 id입니다: {book_id!r}")
+            books.append({
+                "id": book_id,
+                "text": text,
+                "characters": resolve(entry.get("characters", characters)),
+                "lexicon": resolve(entry.get("lexicon", lexicon)),
+                "chapter_pattern": entry.get("chapter_pattern", chapter_pattern),
+                "window": entry.get("window", window)
+            })
+    ids = [book["id"] for book in books]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"{path}: 같은 id(출력 이름)를 가진 책이 있습니다.")
+    return books
+
+def _load_characters(value) -> List[str]:
+    if isinstance(value, list):
+        return value
+    if value is None:
+        raise ValueError("등장인물 목록이 없습니다 (characters.txt 또는 --characters).")
+    text, _ = read_text_file(value)
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+def _load_lexicon(value) -> Dict[str, List[str]]:
+    if isinstance(value, dict):
+        return value
+    if value is None:
+        raise ValueError("감정어 사전이 없습니다 (attitude_lexicon.json 또는 --lexicon).")
+    text, _ = read_text_file(value)
+    return json.loads(text)
+
+# === 체크포인트 ===
+def _file_signature(value) -> object:
+    # 파일은 크기와 수정 시각으로, 직접 적힌 목록·사전은 내용으로 비교
+    if isinstance(value, str):
+        stat = os.stat(value)
+        return [stat.st_size, stat.st_mtime_ns]
+    return value
+
+def book_signature(book: Dict) -> str:
+    """책 입력(본문·등장인물·감정어 사전·챕터 정규식·문장 창)이 바뀌었는지 판단하는 해시"""
+    parts = [_file_signature(book["text"]), _file_signature(book["characters"]),
+             _file_signature(book["lexicon"]), book["chapter_pattern"], core_analysis.MATCHER_VERSION]
+    # 문장 단위(창 크기 1)는 문장 창 도입 전 체크포인트와 같은 해시를 유지
+    window = book.get("window", 1)
+    if window > 1:
+        parts.append(window)
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def load_checkpoint(path: str) -> Dict[str, Dict]:
+    """책 id -> 마지막 기록 (마지막 줄이 중단으로 잘렸으면 무시)"""
+    records = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[record["id"]] = record
+    except FileNotFoundError:
+        pass
+    return records
+
+def _end_last_line(path: str):
+    """중단으로 잘린 마지막 줄 뒤에 새 기록이 이어 붙지 않도록 줄바꿈을 채움"""
+    try:
+        with open(path, "rb+") as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    except FileNotFoundError:
+        pass
+
+def _output_path(output_dir: str, book_id: str) -> str:
+    """책 id의 출력 파일 경로 (출력 디렉터리 밖을 가리키면 ValueError)"""
+    output = os.path.join(output_dir, *book_id.split("/")) + OUTPUT_SUFFIX
+    root = os.path.abspath(output_dir)
+    if os.path.commonpath([root, os.path.abspath(output)]) != root:
+        raise ValueError(f"출력 디렉터리 밖을 가리키는 id입니다: {book_id!r}")
+    return output
+
+# === 책 하나 분석 (작업자 프로세스) ===
+def analyze_book(book: Dict, output_dir: str, encoding: Optional[str] = None) -> Dict:
+    """책 하나를 분석해 NDJSON으로 기록하고 요약 기록을 반환
+
+    결과는 임시 파일에 쓴 뒤 이름을 바꾸므로 중단되어도 반쯤 쓰인 출력이 남지 않는다.
+    """
+    started = time.perf_counter()
+    characters = _load_characters(book["characters"])
+    lexicon = _load_lexicon(book["lexicon"])
+    output = _output_path(output_dir, book["id"])
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    tmp_path = f"{output}.{os.getpid()}.tmp"
+    counts = {"chapters": 0, "relations": 0}
+
+    def counted(events: Iterable[Dict]):
+        for event in events:
+            if event["type"] == "chapter":
+                counts["chapters"] += 1
+                counts["relations"] += len(event["relations"])
+            yield event
+
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            write_ndjson(counted(iter_analysis_file(book["text"], characters, lexicon, book["chapter_pattern"],
+                                                    encoding=encoding, window=book.get("window", 1))), f)
+        os.replace(tmp_path, output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {
+        "output": output,
+        "chapters": counts["chapters"],
+        "relations": counts["relations"],
+        "size": os.path.getsize(book["text"]),
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+def _worker_init(verbose: bool):
+    # 책마다 챕터 단위 INFO 로그가 쏟아지지 않도록
+    if not verbose:
+        logging.getLogger(core_analysis.__name__).setLevel(logging.WARNING)
+
+# === 배치 실행 ===
+def run_batch(books: List[Dict], output_dir: str, workers: int = 1, encoding: Optional[str] = None,
+              force: bool = False, verbose: bool = False) -> Dict[str, int]:
+    """책들을 프로세스 풀에서 분석 (체크포인트에 끝난 것으로 기록된 책은 건너뜀)
+
+    반환: {"done": 이번에 끝낸 책 수, "skipped": 건너뛴 책 수, "failed": 실패한 책 수}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+    finished = {} if force else load_checkpoint(checkpoint_path)
+    _end_last_line(checkpoint_path)
+    todo = []
+    skipped = 0
+    for book in books:
+        try:
+            signature = book_signature(book)
+        except OSError as e:
+            signature = None
+            logger.warning(f"입력 파일을 확인할 수 없습니다: {book['id']} - {e}")
+        record = finished.get(book["id"])
+        if (record is not None and record["status"] == "done" and record["signature"] == signature
+                and os.path.exists(_output_path(output_dir, book["id"]))):
+            skipped += 1
+            continue
+        todo.append((book, signature))
+    logger.info(f"배치 분석: 책 {len(books)}권 중 {skipped}권은 이미 끝남, {len(todo)}권 분석 (작업자 {workers}개)")
+
+    summary = {"done": 0, "skipped": skipped, "failed": 0}
+    pending = {}  # future -> (책, 입력 해시)
+    queue = iter(todo)
+    exhausted = False
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_worker_init, initargs=(verbose,)) as pool:
+        try:
+            while True:
+                # 수천 권이어도 대기 작업은 작업자 수의 두 배까지만 제출
+                while not exhausted and len(pending) < workers * 2:
+                    item = next(queue, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    pending[pool.submit(analyze_book, item[0], output_dir, encoding)] = item
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    book, signature = pending.pop(future)
+                    record = {"id": book["id"], "text": book["text"], "signature": signature}
+                    try:
+                        record.update(future.result(), status="done")
+                        summary["done"] += 1
+                        mb_per_s = record["size"] / (1024 * 1024) / record["seconds"] if record["seconds"] else 0.0
+                        logger.info(f"[{summary['done'] + summary['failed']}/{len(todo)}] {book['id']} 완료: "
+                                    f"관계 {record['relations']}개, {record['seconds']:.1f}초, {mb_per_s:.2f}MB/s")
+                    except Exception as e:
+                        record.update(status="failed", error=str(e))
+                        summary["failed"] += 1
+                        logger.error(f"[{summary['done'] + summary['failed']}/{len(todo)}] {book['id']} 실패: {e}")
+                    checkpoint.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    checkpoint.flush()
+        except KeyboardInterrupt:
+            logger.warning("중단 요청: 진행 중인 책은 다음 실행에서 다시 분석합니다.")
+            for future in pending:
+                future.cancel()
+            raise
+    logger.info(f"배치 분석 완료: 완료 {summary['done']}권, 건너뜀 {summary['skipped']}권, 실패 {summary['failed']}권")
+    return summary
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="디렉터리나 매니페스트의 책들을 병렬로 분석해 책마다 NDJSON으로 저장")
+    parser.add_argument("input", help="책(.txt)이 있는 디렉터리 또는 매니페스트(.jsonl)")
+    parser.add_argument("output", help="결과 디렉터리 (책마다 <id>.ndjson, 체크포인트 checkpoint.jsonl)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="동시에 분석할 책 수 (프로세스 수)")
+    parser.add_argument("--characters", help="책별·디렉터리별 파일이 없을 때 쓸 등장인물 목록 파일")
+    parser.add_argument("--lexicon", help="책별·디렉터리별 파일이 없을 때 쓸 감정어 사전 파일")
+    parser.add_argument("--chapter-pattern", default=DEFAULT_CHAPTER_PATTERN, help="챕터 제목 정규식")
+    parser.add_argument("--window", type=int, default=1,
+                        help="연속한 몇 문장 안에서 관계를 찾을지 (기본 1: 같은 문장 안에서만)")
+    parser.add_argument("--encoding", help="본문 인코딩 (생략하면 책마다 자동 감지)")
+    parser.add_argument("--force", action="store_true", help="체크포인트를 무시하고 모든 책을 다시 분석")
+    parser.add_argument("--verbose", action="store_true", help="챕터 단위 로그 출력")
+    args = parser.parse_args(argv)
+    if args.window < 1:
+        parser.error("--window는 1 이상이어야 합니다.")
+
+    characters = os.path.abspath(args.characters) if args.characters else None
+    lexicon = os.path.abspath(args.lexicon) if args.lexicon else None
+    if os.path.isdir(args.input):
+        books = scan_directory(args.input, characters, lexicon, args.chapter_pattern, args.window)
+    else:
+        books = read_manifest(args.input, characters, lexicon, args.chapter_pattern, args.window)
+    _worker_init(args.verbose)
+    try:
+        summary = run_batch(books, args.output, max(1, args.workers), args.encoding, args.force, args.verbose)
+    except KeyboardInterrupt:
+        return 130
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,382 @@
+"""core_analysis 성능 벤치마크
+
+재현 가능한(시드 고정) 합성 말뭉치로 챕터 분할, 문장 분할, 청크 분할, 관계 추출,
+전체 분석(run_analysis)의 실행 시간과 최대 메모리를 측정한다.
+결과는 JSON 기준선으로 저장하고, 같은 시나리오를 다시 실행해 기준선과 비교할 수 있다.
+
+    python benchmark.py run                      # quick 시나리오 측정 결과 출력
+    python benchmark.py run --save               # 측정 결과를 기준선으로 저장
+    python benchmark.py check                    # 기준선과 비교 (느려지면 종료 코드 1)
+    python benchmark.py run --profile full       # 10MB/100MB 말뭉치 포함
+    python benchmark.py verify                   # 결과 일관성 회귀 사례 확인 (틀리면 종료 코드 1)
+"""
+import argparse
+import gc
+import hashlib
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List, Dict, Tuple, Callable
+
+import core_analysis
+from core_analysis import (
+    split_into_chapters_stream, split_sentences, chunk_text, extract_relations, run_analysis, run_analysis_file
+)
+
+# 기준선 파일 기본 경로 (측정값은 기기마다 다르므로 저장소에 넣지 않는다)
+DEFAULT_BASELINE = "benchmark_baseline.json"
+BASELINE_VERSION = 1
+# 기본 허용 오차: 시간은 25%, 최대 메모리는 10%까지 늘어도 회귀로 보지 않음
+DEFAULT_TIME_TOLERANCE = 0.25
+DEFAULT_MEMORY_TOLERANCE = 0.10
+# 이보다 짧은 단계는 측정 잡음이 커서 시간 회귀 판정에서 제외
+MIN_TIMED_SECONDS = 0.005
+CHAPTER_PATTERN = r"(Letter \d+|Chapter \d+)"
+
+logger = logging.getLogger(__name__)
+
+# === 합성 말뭉치 생성 ===
+_ENGLISH_SYLLABLES = ("al", "be", "ca", "dor", "el", "fin", "gar", "ha", "is", "jo", "ka", "lo", "mar", "ne", "or", "pe", "ri", "sa", "tor", "vi")
+_KOREAN_SYLLABLES = "가나다라마바사아자차카타파하빅터엘리자베스클레발저스틴민서준영수희"
+_KOREAN_PARTICLES = ("", "는", "가", "에게", "를", "의")
+_ENGLISH_FILLER = ("the", "and", "of", "to", "in", "was", "that", "he", "she", "it", "with", "as", "his", "her", "at", "by", "on", "from", "which", "had", "night", "house", "letter", "river", "long", "cold", "walked", "spoke", "looked", "again")
+_KOREAN_FILLER = ("그리고", "그날", "밤에", "집으로", "오래", "조용히", "편지를", "강가에서", "다시", "말했다", "바라보았다", "걸었다", "차가운", "긴", "그는", "그녀는", "모든", "것이")
+
+def _make_words(rng: random.Random, count: int, korean: bool, syllables: Tuple[int, int], taken: set) -> List[str]:
+    """겹치지 않는 합성 단어(인물 이름·감정어) count개"""
+    words = []
+    while len(words) < count:
+        size = rng.randint(*syllables)
+        if korean:
+            word = "".join(rng.choice(_KOREAN_SYLLABLES) for _ in range(size))
+        else:
+            word = "".join(rng.choice(_ENGLISH_SYLLABLES) for _ in range(size))
+        if word not in taken:
+            taken.add(word)
+            words.append(word)
+    return words
+
+def _split_mixed(rng: random.Random, count: int, korean_ratio: float, syllables: Tuple[int, int], taken: set) -> Tuple[List[str], List[str]]:
+    korean_count = round(count * korean_ratio)
+    english = [w.capitalize() for w in _make_words(rng, count - korean_count, False, syllables, taken)]
+    korean = _make_words(rng, korean_count, True, syllables, taken)
+    return english, korean
+
+def generate_corpus(
+    seed: int = 0,
+    size_mb: float = 1.0,
+    chapters: int = 50,
+    cast_size: int = 10,
+    lexicon_size: int = 40,
+    density: float = 0.2,
+    korean_ratio: float = 0.0
+) -> Tuple[str, List[str], Dict[str, List[str]]]:
+    """시드 고정 합성 말뭉치 -> (본문, 등장인물, 감정어 사전)
+
+    size_mb: 본문 크기 (UTF-8 기준 MB)
+    chapters: "Chapter N" 제목으로 나뉘는 챕터 수
+    cast_size / lexicon_size: 등장인물 수 / 감정어 수 (긍정·부정 반씩)
+    density: 인물 두 명 이상과 감정어가 함께 나오는 문장의 비율
+    korean_ratio: 한국어 문장(과 한국어 이름·감정어)의 비율
+    같은 인자로 만든 말뭉치는 항상 같다.
+    """
+    rng = random.Random(seed)
+    taken = set(_ENGLISH_FILLER) | set(_KOREAN_FILLER)
+    names_en, names_ko = _split_mixed(rng, cast_size, korean_ratio, (2, 3), taken)
+    emotions_en, emotions_ko = _split_mixed(rng, lexicon_size, korean_ratio, (2, 4), taken)
+    emotions_en = [w.lower() for w in emotions_en]
+    characters = names_en + names_ko
+    emotions = emotions_en + emotions_ko
+    lexicon = {"positive": emotions[::2], "negative": emotions[1::2]}
+
+    def sentence(korean: bool) -> str:
+        names = (names_ko or names_en) if korean else (names_en or names_ko)
+        lexicon_words = (emotions_ko or emotions_en) if korean else (emotions_en or emotions_ko)
+        filler = _KOREAN_FILLER if korean else _ENGLISH_FILLER
+        words = rng.choices(filler, k=rng.randint(4, 14))
+        if names and lexicon_words and rng.random() < density:
+            cast = rng.sample(names, min(len(names), rng.randint(2, 3)))
+            extra = [rng.choice(lexicon_words)]
+        else:
+            cast = rng.sample(names, rng.randint(0, min(1, len(names))))
+            extra = []
+        if korean:
+            cast = [name + rng.choice(_KOREAN_PARTICLES) for name in cast]
+        for word in cast + extra:
+            words.insert(rng.randint(0, len(words)), word)
+        text = " ".join(words)
+        return text[0].upper() + text[1:] + rng.choice(".....?!")
+
+    target = int(size_mb * 1024 * 1024)
+    chapter_bytes = max(1, target // max(1, chapters))
+    parts = []
+    written = 0
+    for number in range(1, chapters + 1):
+        heading = ("\n" if number > 1 else "") + f"Chapter {number}\n"
+        parts.append(heading)
+        written += len(heading)
+        limit = target if number == chapters else min(target, number * chapter_bytes)
+        while written < limit:
+            line = sentence(rng.random() < korean_ratio) + (" " if rng.random() < 0.9 else "\n")
+            parts.append(line)
+            written += len(line.encode("utf-8"))
+    return "".join(parts), characters, lexicon
+
+# === 시나리오 ===
+# 기본값에서 한 가지씩 바꾼 시나리오 (이름 -> generate_corpus 인자)
+_BASE_SCENARIO = {"seed": 0, "size_mb": 1.0, "chapters": 50, "cast_size": 10, "lexicon_size": 40, "density": 0.2, "korean_ratio": 0.0}
+SCENARIOS = {
+    "base-1mb": {},
+    "chapters-1000": {"chapters": 1000},
+    "cast-200": {"cast_size": 200},
+    "lexicon-2000": {"lexicon_size": 2000},
+    "dense": {"density": 0.8},
+    "korean-mixed": {"korean_ratio": 0.5},
+    "korean-only": {"korean_ratio": 1.0},
+    "base-10mb": {"size_mb": 10.0, "chapters": 200},
+    "mixed-10mb": {"size_mb": 10.0, "chapters": 200, "cast_size": 50, "lexicon_size": 200, "korean_ratio": 0.5},
+    "base-100mb": {"size_mb": 100.0, "chapters": 1000},
+}
+PROFILES = {
+    "quick": ["base-1mb", "chapters-1000", "cast-200", "lexicon-2000", "dense", "korean-mixed", "korean-only"],
+    "full": list(SCENARIOS),
+}
+
+def scenario_params(name: str) -> Dict:
+    return {**_BASE_SCENARIO, **SCENARIOS[name]}
+
+# === 측정 ===
+def _consume(iterable) -> int:
+    count = 0
+    for _ in iterable:
+        count += 1
+    return count
+
+def _stages(text: str, characters: List[str], lexicon: Dict[str, List[str]]) -> Dict[str, Callable[[], object]]:
+    """측정할 단계 (이름 -> 인자 없는 함수)"""
+    chapters = list(split_into_chapters_stream(text, CHAPTER_PATTERN))
+    emotions = lexicon["positive"] + lexicon["negative"]
+
+    def extract_all():
+        return sum(len(extract_relations(body, characters, emotions, title)) for title, body in chapters)
+
+    return {
+        "split_into_chapters_stream": lambda: _consume(split_into_chapters_stream(text, CHAPTER_PATTERN)),
+        "split_sentences": lambda: len(split_sentences(text)),
+        "chunk_text": lambda: _consume(chunk_text(text)),
+        "extract_relations": extract_all,
+        "run_analysis": lambda: len(run_analysis(text, characters, lexicon, CHAPTER_PATTERN, compact=True)["relations"]),
+    }
+
+def _time(func: Callable[[], object], repeat: int) -> float:
+    """repeat번 실행 중 가장 짧은 시간 (초)"""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _peak_memory(func: Callable[[], object]) -> int:
+    """실행 중 Python 할당 최대량 (바이트, tracemalloc 기준)
+
+    tracemalloc은 실행을 느리게 하므로 시간 측정과 따로 한 번 더 실행한다.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_scenario(params: Dict, repeat: int = 3) -> Dict:
+    """시나리오 하나의 말뭉치를 만들고 단계별 시간·최대 메모리를 측정"""
+    text, characters, lexicon = generate_corpus(**params)
+    data = text.encode("utf-8")
+    size_mb = len(data) / (1024 * 1024)
+    stages = {}
+    for name, func in _stages(text, characters, lexicon).items():
+        seconds = _time(func, repeat)
+        stages[name] = {
+            "seconds": round(seconds, 6),
+            "mb_per_s": round(size_mb / seconds, 3) if seconds else None,
+            "peak_bytes": _peak_memory(func)
+        }
+    return {
+        "params": params,
+        "corpus": {
+            "bytes": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "characters": len(characters),
+            "emotions": len(lexicon["positive"]) + len(lexicon["negative"])
+        },
+        "stages": stages
+    }
+
+def run_benchmarks(names: List[str], repeat: int = 3, params: Dict[str, Dict] = None) -> Dict:
+    """시나리오들을 측정해 기준선 형식의 dict로 반환 (params가 주어지면 그 인자를 사용)"""
+    results = {}
+    for name in names:
+        logger.info(f"시나리오 측정 중: {name}")
+        results[name] = run_scenario((params or {}).get(name) or scenario_params(name), repeat)
+    return {
+        "version": BASELINE_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "system": platform.system()
+        },
+        "repeat": repeat,
+        "scenarios": results
+    }
+
+# === 기준선 비교 ===
+def compare(baseline: Dict, current: Dict, time_tolerance: float = DEFAULT_TIME_TOLERANCE,
+            memory_tolerance: float = DEFAULT_MEMORY_TOLERANCE) -> List[Dict]:
+    """기준선 대비 단계별 변화 목록 (regression=True면 허용 오차를 넘어 나빠진 것)"""
+    rows = []
+    for name, scenario in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        if base["corpus"]["sha256"] != scenario["corpus"]["sha256"]:
+            logger.warning(f"{name}: 말뭉치가 기준선과 다릅니다 (생성기 변경?) - 비교 결과를 신뢰할 수 없습니다.")
+        for stage, measured in scenario["stages"].items():
+            reference = base["stages"].get(stage)
+            if reference is None:
+                continue
+            time_ratio = measured["seconds"] / reference["seconds"] if reference["seconds"] else 1.0
+            memory_ratio = measured["peak_bytes"] / reference["peak_bytes"] if reference["peak_bytes"] else 1.0
+            slower = time_ratio > 1 + time_tolerance and measured["seconds"] >= MIN_TIMED_SECONDS
+            rows.append({
+                "scenario": name,
+                "stage": stage,
+                "seconds": measured["seconds"],
+                "baseline_seconds": reference["seconds"],
+                "time_ratio": round(time_ratio, 3),
+                "peak_bytes": measured["peak_bytes"],
+                "baseline_peak_bytes": reference["peak_bytes"],
+                "memory_ratio": round(memory_ratio, 3),
+                "regression": slower or memory_ratio > 1 + memory_tolerance
+            })
+    return rows
+
+# === 결과 일관성 (회귀 사례) ===
+def _verify_window_dedup() -> Tuple[bool, str]:
+    # 한 번 함께 나온 근거가 창 안에 남아 있는 동안 같은 관계를 다시 세지 않아야 한다
+    repeated_mention = len(extract_relations("Ann Bob love. Ann. Ann. Ann.", ["Ann", "Bob"], ["love"], "T", window=3))
+    # 그 자체로 관계가 성립하는 문장은 창 크기와 관계없이 모두 세야 한다 (문장 단위 10건)
+    repeated_sentence = [len(extract_relations("Ann loves Bob. " * 10, ["Ann", "Bob"], ["loves"], "T", window=window))
+                         for window in (1, 2, 3, 5)]
+    ok = repeated_mention == 1 and repeated_sentence == [10] * 4
+    return ok, f"반복 언급 {repeated_mention}건 (기대 1건), 반복 문장 창 1/2/3/5: {repeated_sentence} (기대 각 10건)"
+
+def _verify_chapter_modes() -> Tuple[bool, str]:
+    # 제목 바로 뒤에 본문이 붙어 있어도 챕터 첫 단어를 직렬·병렬·파일·legacy 모드가 똑같이 인식해야 한다
+    text = "Chapter 1Ann loves Bob. Chapter 2 Ann loves Bob."
+    characters, lexicon = ["Ann", "Bob"], {"positive": ["loves"], "negative": []}
+    counts = {
+        "serial": len(run_analysis(text, characters, lexicon, CHAPTER_PATTERN)["relations"]),
+        "workers=2": len(run_analysis(text, characters, lexicon, CHAPTER_PATTERN, workers=2)["relations"]),
+        "legacy": len(run_analysis(text, characters, lexicon, CHAPTER_PATTERN, matcher="legacy")["relations"]),
+    }
+    fd, path = tempfile.mkstemp(suffix=".txt")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        counts["file"] = len(run_analysis_file(path, characters, lexicon, CHAPTER_PATTERN)["relations"])
+    finally:
+        os.remove(path)
+    return set(counts.values()) == {2}, ", ".join(f"{mode} {count}건" for mode, count in counts.items()) + " (기대 2건)"
+
+VERIFY_CASES: Dict[str, Callable[[], Tuple[bool, str]]] = {
+    "window_dedup": _verify_window_dedup,
+    "chapter_modes": _verify_chapter_modes,
+}
+
+def verify() -> List[Dict]:
+    """회귀 사례별 결과 (ok=False면 실패)"""
+    rows = []
+    for name, case in VERIFY_CASES.items():
+        ok, detail = case()
+        rows.append({"case": name, "ok": ok, "detail": detail})
+    return rows
+
+def _print_results(report: Dict):
+    print(f"{'scenario':<16} {'stage':<28} {'seconds':>10} {'MB/s':>9} {'peak MB':>9}")
+    for name, scenario in report["scenarios"].items():
+        for stage, measured in scenario["stages"].items():
+            print(f"{name:<16} {stage:<28} {measured['seconds']:>10.4f} {measured['mb_per_s'] or 0:>9.2f} "
+                  f"{measured['peak_bytes'] / (1024 * 1024):>9.2f}")
+
+def _print_comparison(rows: List[Dict]):
+    print(f"{'scenario':<16} {'stage':<28} {'time':>8} {'memory':>8}")
+    for row in rows:
+        mark = "  <- 회귀" if row["regression"] else ""
+        print(f"{row['scenario']:<16} {row['stage']:<28} {row['time_ratio']:>7.2f}x {row['memory_ratio']:>7.2f}x{mark}")
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="core_analysis 벤치마크 (합성 말뭉치)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="시나리오 측정")
+    check_parser = sub.add_parser("check", help="기준선과 비교 (회귀가 있으면 종료 코드 1)")
+    for p in (run_parser, check_parser):
+        p.add_argument("--baseline", default=DEFAULT_BASELINE, help="기준선 JSON 경로")
+        p.add_argument("--repeat", type=int, default=3, help="시간 측정 반복 횟수 (가장 짧은 값 사용)")
+        p.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="측정할 시나리오 (여러 번 지정 가능)")
+    run_parser.add_argument("--profile", choices=list(PROFILES), default="quick", help="시나리오 묶음")
+    run_parser.add_argument("--save", action="store_true", help="측정 결과를 기준선으로 저장")
+    run_parser.add_argument("--output", help="측정 결과 JSON 저장 경로")
+    check_parser.add_argument("--time-tolerance", type=float, default=DEFAULT_TIME_TOLERANCE)
+    check_parser.add_argument("--memory-tolerance", type=float, default=DEFAULT_MEMORY_TOLERANCE)
+    sub.add_parser("verify", help="결과 일관성 회귀 사례 확인 (틀리면 종료 코드 1)")
+    args = parser.parse_args(argv)
+
+    # 챕터마다 남기는 INFO 로그가 측정을 방해하지 않도록
+    logging.getLogger(core_analysis.__name__).setLevel(logging.WARNING)
+
+    if args.command == "verify":
+        rows = verify()
+        for row in rows:
+            print(f"{row['case']:<28} {'ok' if row['ok'] else 'FAIL':<5} {row['detail']}")
+        return 0 if all(row["ok"] for row in rows) else 1
+
+    if args.command == "run":
+        report = run_benchmarks(args.scenario or PROFILES[args.profile], args.repeat)
+        _print_results(report)
+        for path in filter(None, (args.output, args.baseline if args.save else None)):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            print(f"저장: {path}")
+        return 0
+
+    try:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"기준선이 없습니다: {args.baseline} (먼저 'python benchmark.py run --save' 실행)", file=sys.stderr)
+        return 2
+    if baseline.get("version") != BASELINE_VERSION:
+        print(f"기준선 형식이 다릅니다: {baseline.get('version')}", file=sys.stderr)
+        return 2
+    names = args.scenario or list(baseline["scenarios"])
+    params = {name: baseline["scenarios"][name]["params"] for name in names if name in baseline["scenarios"]}
+    report = run_benchmarks(names, args.repeat, params)
+    rows = compare(baseline, report, args.time_tolerance, args.memory_tolerance)
+    _print_comparison(rows)
+    regressions = [row for row in rows if row["regression"]]
+    print(f"회귀 {len(regressions)}건 / 비교 {len(rows)}건")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
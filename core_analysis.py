@@ -1,188 +1,1998 @@
 import re
+import os
+import sys
 import json
-from collections import defaultdict, Counter
-from typing import List, Dict, Tuple, Generator, Optional
+import mmap
+import codecs
+import time
+import pickle
+import hashlib
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager, nullcontext
+from collections import defaultdict, Counter, OrderedDict, deque
+from typing import List, Dict, Tuple, Generator, Iterator, Iterable, Callable, Optional, Set
 import logging
+import threading
+from array import array
+
+import numpy as np
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # === 텍스트 스트리밍 처리 유틸 ===
+# 챕터 뷰: (제목, 원문, 시작 오프셋, 끝 오프셋) - 챕터 내용을 복사하지 않고 원문 범위로 가리킨다
+ChapterView = Tuple[str, str, int, int]
+
+_LEADING_SPACE = re.compile(r'\s*')
+
+def _chapter_title(match: re.Match) -> str:
+    # 그룹이 하나면 그 그룹(re.findall과 같은 기준), 아니면 일치 전체를 제목으로 사용
+    return match.group(1) if match.re.groups == 1 else match.group(0)
+
+class ChapterIndex:
+    """텍스트를 한 번만 스캔해 만든 챕터 (제목, 시작, 끝) 오프셋 표
+
+    챕터 내용은 필요할 때 원문 범위(뷰) 또는 해당 챕터 하나의 문자열로 제공한다.
+    """
+
+    def __init__(self, text: str, pattern: str):
+        self.text = text
+        self.entries: List[Tuple[str, int, int]] = []
+
+        matches = re.finditer(pattern, text)
+        prev = next(matches, None)
+        if prev is None:
+            # 챕터 구분이 없는 경우 전체를 하나의 챕터로 처리
+            self.entries.append(("전체 텍스트", 0, len(text)))
+            return
+        for m in matches:
+            self._add(prev, m.start())
+            prev = m
+        self._add(prev, len(text))
+
+    def _add(self, match: re.Match, end: int):
+        # 챕터 내용 앞뒤 공백 제외 (str.strip과 같은 기준)
+        start = _LEADING_SPACE.match(self.text, match.end(), end).end()
+        while end > start and self.text[end - 1].isspace():
+            end -= 1
+        self.entries.append((_chapter_title(match), start, end))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def views(self) -> Generator[ChapterView, None, None]:
+        for title, start, end in self.entries:
+            yield title, self.text, start, end
+
+    def __iter__(self) -> Generator[Tuple[str, str], None, None]:
+        for title, start, end in self.entries:
+            yield title, self.text[start:end]
+
 def split_into_chapters_stream(text: str, pattern: str) -> Generator[Tuple[str, str], None, None]:
     """대용량 텍스트를 챕터 단위로 스트리밍 방식으로 분할"""
-    chapter_titles = re.findall(pattern, text)
-    chunks = re.split(pattern, text)
-    
-    if len(chunks) <= 1:
-        # 챕터 구분이 없는 경우 전체를 하나의 챕터로 처리
-        yield ("전체 텍스트", text)
-        return
-        
-    for i in range(1, min(len(chunks), len(chapter_titles) + 1)):
+    yield from ChapterIndex(text, pattern)
+
+# === 파일 입력 (점진적 디코딩) ===
+# BOM이 없을 때 시도하는 인코딩 순서
+# cp949는 euc-kr의 상위 집합이라 앞부분에 확장 한글이 없어도 뒤에서 실패하지 않고,
+# latin-1은 항상 성공하므로 마지막에 둔다
+CANDIDATE_ENCODINGS = ['utf-8', 'cp949', 'latin-1']
+ENCODING_PROBE_BYTES = 64 * 1024
+READ_BLOCK_BYTES = 1024 * 1024
+# 블록 끝에 걸친 챕터 제목이 다음 블록에서 더 길어질 수 있으므로 확정을 미루는 길이(문자 수)
+HEADING_LOOKAHEAD = 256
+
+_NON_ASCII = re.compile(rb'[\x80-\xff]')
+
+def detect_encoding(prefix: bytes, final: bool = False) -> Optional[str]:
+    """파일 앞부분만 보고 인코딩 추정 (final=False면 잘린 멀티바이트 문자는 허용)"""
+    if prefix.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    for enc in CANDIDATE_ENCODINGS:
         try:
-            title = chapter_titles[i-1]
-            content = chunks[i] if i < len(chunks) else ""
-            yield (title, content.strip())
-        except IndexError:
-            logger.warning(f"인덱스 에러 발생. i={i}, chunks_len={len(chunks)}, titles_len={len(chapter_titles)}")
+            codecs.getincrementaldecoder(enc)().decode(prefix, final=final)
+            return enc
+        except UnicodeDecodeError:
             continue
+    return None
+
+def _encoding_probe(data) -> Tuple[bytes, bool]:
+    """인코딩 판별용 바이트 조각 (앞부분이 ASCII뿐이면 첫 비ASCII 바이트 주변을 사용)"""
+    prefix = data[:ENCODING_PROBE_BYTES]
+    if prefix.isascii() and len(data) > len(prefix):
+        m = _NON_ASCII.search(data, len(prefix))
+        if m is None:
+            return prefix, True
+        # 비ASCII 바이트 앞의 ASCII 문자는 모든 후보 인코딩에서 문자 경계다
+        return data[m.start():m.start() + ENCODING_PROBE_BYTES], m.start() + ENCODING_PROBE_BYTES >= len(data)
+    return prefix, len(prefix) == len(data)
+
+def detect_file_encoding(path: str) -> str:
+    """파일 전체를 디코딩하지 않고 앞부분(또는 첫 비ASCII 구간)만으로 인코딩 판별"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return CANDIDATE_ENCODINGS[0]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            encoding = detect_encoding(*_encoding_probe(data))
+    if encoding is None:
+        raise UnicodeError("파일 인코딩을 인식할 수 없습니다. UTF-8, EUC-KR, CP949 중 하나를 사용해 주세요.")
+    logger.info(f"파일 인코딩 감지: {encoding}")
+    return encoding
+
+def _iter_file_blocks(path: str, encoding: Optional[str] = None, block_size: int = READ_BLOCK_BYTES) -> Generator[str, None, None]:
+    """파일을 메모리 맵으로 열어 블록 단위로 점진적으로 디코딩"""
+    if encoding is None:
+        encoding = detect_file_encoding(path)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            decoder = codecs.getincrementaldecoder(encoding)()
+            for offset in range(0, len(data), block_size):
+                block = decoder.decode(data[offset:offset + block_size])
+                if block:
+                    yield block
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+
+def _stream_chapters(blocks: Iterable[str], pattern: str) -> Generator[Tuple[str, str], None, None]:
+    """디코딩된 블록 흐름에서 챕터를 찾는 즉시 (제목, 내용)을 생성
+
+    ChapterIndex와 같은 결과를 내며, 버퍼에는 현재 챕터와 블록 하나 정도만 남는다.
+    """
+    regex = re.compile(pattern)
+    buf = ""
+    title = None  # 현재 챕터 제목 (첫 제목 이전의 머리말은 버린다)
+    content_start = 0
+    cursor = 0
+    eof = False
+    blocks = iter(blocks)
+    while not eof:
+        block = next(blocks, None)
+        if block is None:
+            eof = True
+        else:
+            buf += block
+        while True:
+            m = regex.search(buf, cursor)
+            if m is None or (not eof and m.end() > len(buf) - HEADING_LOOKAHEAD):
+                # 버퍼 끝 근처의 일치는 다음 블록을 받은 뒤 다시 확인
+                cursor = m.start() if m is not None else max(cursor, len(buf) - HEADING_LOOKAHEAD)
+                break
+            if m.end() == m.start():
+                raise ValueError(f"챕터 정규식이 빈 문자열과 일치합니다: {pattern}")
+            if title is not None:
+                yield title, buf[content_start:m.start()].strip()
+            title = _chapter_title(m)
+            # 이전 챕터는 내보냈으므로 버퍼에서 제거
+            buf = buf[m.start():]
+            content_start = cursor = m.end() - m.start()
+    if title is None:
+        # 챕터 구분이 없는 경우 전체를 하나의 챕터로 처리
+        yield "전체 텍스트", buf
+    else:
+        yield title, buf[content_start:].strip()
+
+def iter_file_chapters(path: str, pattern: str, encoding: Optional[str] = None) -> Generator[Tuple[str, str], None, None]:
+    """텍스트 파일을 전체 로드하지 않고 챕터 단위로 읽음"""
+    yield from _stream_chapters(_iter_file_blocks(path, encoding), pattern)
+
+def read_text_file(path: str, encoding: Optional[str] = None) -> Tuple[str, str]:
+    """앞부분으로 인코딩을 판별한 뒤 파일을 한 번만 디코딩해 (텍스트, 인코딩) 반환"""
+    if encoding is None:
+        encoding = detect_file_encoding(path)
+    return "".join(_iter_file_blocks(path, encoding)), encoding
+
+# 문장 분할 패턴 확장 (한글 포함)
+_SENTENCE_DELIMITER = re.compile(r'[.?!。？！]\s*')
+
+# 청크 목표 크기(문자 수)
+DEFAULT_CHUNK_SIZE = 100000
 
 def split_sentences(text: str) -> List[str]:
     """텍스트를 문장 단위로 분할"""
-    # 문장 분할 패턴 확장 (한글 포함)
-    return re.split(r'[.?!。？！]\s*', text)
+    return _SENTENCE_DELIMITER.split(text)
+
+def split_sentence_spans(text: str, start: int = 0, end: Optional[int] = None) -> List[Tuple[int, int]]:
+    """split_sentences와 같은 기준으로 나눈 문장의 (시작, 끝) 오프셋 목록
+
+    start/end를 주면 text[start:end]를 복사하지 않고 그 범위만 나눈다 (오프셋은 text 기준).
+    """
+    if end is None:
+        end = len(text)
+    spans = []
+    prev_end = start
+    for m in _SENTENCE_DELIMITER.finditer(text, start, end):
+        spans.append((prev_end, m.start()))
+        prev_end = m.end()
+    spans.append((prev_end, end))
+    return spans
+
+def chunk_sentence_spans(spans: List[Tuple[int, int]], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Generator[List[Tuple[int, int]], None, None]:
+    """문장 오프셋 목록을 약 chunk_size 문자 단위로 묶음 (문장은 절대 나누지 않음)
+
+    chunk_size보다 긴 문장은 그 문장 하나로 청크를 이룬다.
+    """
+    chunk = []
+    for span in spans:
+        if chunk and span[1] - chunk[0][0] > chunk_size:
+            yield chunk
+            chunk = []
+        chunk.append(span)
+    if chunk:
+        yield chunk
+
+def chunk_text(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Generator[str, None, None]:
+    """대용량 텍스트를 문장 경계에 맞춘 청크 단위로 분할하여 메모리 부담 감소
+
+    청크를 모두 이어 붙이면 원문과 같고, 문장이 두 청크에 걸쳐 잘리지 않는다.
+    """
+    cut = 0
+    for chunk_spans in chunk_sentence_spans(split_sentence_spans(text), chunk_size):
+        if chunk_spans[0][0] > cut:
+            # 다음 문장 시작 위치에서 자르므로 앞 청크가 문장 구분자를 가진다
+            yield text[cut:chunk_spans[0][0]]
+            cut = chunk_spans[0][0]
+    if cut < len(text) or not text:
+        yield text[cut:]
+
+# === 다중 패턴 매처 ===
+# 관계 추출 엔진: "combined"는 결합 정규식 한 번의 스캔, "legacy"는 단어별 정규식 루프
+MATCHER_ENGINES = ("combined", "legacy")
+DEFAULT_MATCHER = "combined"
+
+_WORD_BOUNDARY = re.compile(r'\b')
+_WORD_CHAR = re.compile(r'\w')
+
+# 한국어 조사: 이름/감정어 뒤에 붙어도 (최대 두 개까지, 예: 빅터에게는) 같은 단어로 본다
+KOREAN_PARTICLES = (
+    "에게서", "한테서", "으로서", "으로써", "이라고", "이었다", "께서", "에게", "에서", "한테", "으로", "로서", "로써",
+    "보다", "처럼", "까지", "부터", "조차", "마저", "이나", "이랑", "이며", "라고", "이여", "이다", "였다",
+    "은", "는", "이", "가", "을", "를", "의", "에", "께", "와", "과", "도", "만", "로",
+    "나", "랑", "며", "야", "아", "여", "뿐"
+)
+_PARTICLE_SUFFIX = "(?:" + "|".join(KOREAN_PARTICLES) + "){0,2}"
+
+def _is_hangul(ch: str) -> bool:
+    return "\uac00" <= ch <= "\ud7a3"
 
-def chunk_text(text: str, chunk_size: int = 100000) -> Generator[str, None, None]:
-    """대용량 텍스트를 청크 단위로 분할하여 메모리 부담 감소"""
-    for i in range(0, len(text), chunk_size):
-        yield text[i:i + chunk_size]
+def _trie_regex(words: List[str]) -> str:
+    """단어 목록을 공통 접두사로 묶은 정규식 문자열로 변환 (대소문자 무시 기준)"""
+    end = ""  # 단어가 끝나는 노드 표시
+    root = {}
+    for word in words:
+        node = root
+        for ch in word:
+            # 대소문자만 다른 문자는 같은 분기로 합친다
+            key = ch.lower() if len(ch.lower()) == 1 else ch
+            node = node.setdefault(key, (ch, {}))[1]
+        node[end] = None
+
+    def to_regex(node: Dict) -> str:
+        branches = [re.escape(entry[0]) + to_regex(entry[1]) for key, entry in node.items() if key != end]
+        if end in node:
+            if not branches:
+                return ""
+            branches.append("")  # 더 긴 단어를 먼저 시도하고 마지막에 여기서 끝낸다
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    return to_regex(root)
+
+class LexiconMatcher:
+    """여러 단어를 하나의 결합 정규식으로 묶어 텍스트를 한 번만 스캔하는 매처
+
+    단어별 `\\b단어\\b` 정규식(대소문자 무시)과 동일한 결과를 내도록,
+    같은 위치에서 시작하는 더 짧은 단어(접두 단어)까지 함께 보고한다.
+    particles=True이면 단어 뒤에 한국어 조사가 붙은 경우(빅터는, 사랑을)도 일치로 본다.
+    """
+
+    def __init__(self, words: List[str], particles: bool = False):
+        self.words = list(words)
+        self.lengths = [len(w) for w in self.words]
+
+        by_lower = defaultdict(list)
+        for idx, word in enumerate(self.words):
+            by_lower[word.lower()].append(idx)
+
+        # 트라이 형태의 정규식: 위치마다 가능한 분기만 시도하고 긴 단어를 먼저 시도한다
+        unique = sorted(set(self.words), key=len, reverse=True)
+        alternation = _trie_regex(unique)
+        suffix = _PARTICLE_SUFFIX if particles else ""
+        self.pattern = re.compile(r'(?=\b(' + alternation + r')' + suffix + r'\b)', re.IGNORECASE) if unique else None
+        # pos를 문자열 시작으로 보기 위한 앞쪽 경계 없는 패턴 (pos 앞 문자가 단어 문자일 때만 사용)
+        self._start_pattern = re.compile(r'(?=(?=\w)(' + alternation + r')' + suffix + r'\b)', re.IGNORECASE) if unique else None
+
+        # 가장 긴 일치 단어 -> 같은 위치에서 함께 일치하는 모든 단어 인덱스
+        self._implied = {}
+        for word in unique:
+            key = word.lower()
+            if key not in self._implied:
+                self._implied[key] = self._implied_indices(word, by_lower)
+
+    def _implied_indices(self, word: str, by_lower: Dict[str, List[int]]) -> Tuple[int, ...]:
+        """word가 일치하는 위치에서 함께 일치하는 단어(자기 자신 포함)의 인덱스"""
+        indices = []
+        for k in range(len(word), -1, -1):
+            # 접두 단어는 word 내부의 단어 경계에서 끝나야 한다
+            if k < len(word) and not _WORD_BOUNDARY.match(word, k):
+                continue
+            prefix = word[:k]
+            for idx in by_lower.get(prefix.lower(), ()):
+                if re.fullmatch(re.escape(self.words[idx]), prefix, re.IGNORECASE):
+                    indices.append(idx)
+        return tuple(sorted(indices))
+
+    def _lookup(self, matched: str) -> Tuple[int, ...]:
+        indices = self._implied.get(matched.lower())
+        if indices is None:
+            # 대소문자 변환 규칙이 lower()와 다른 드문 경우
+            for word in sorted(set(self.words), key=len, reverse=True):
+                if re.fullmatch(re.escape(word), matched, re.IGNORECASE):
+                    indices = self._implied[word.lower()]
+                    break
+            else:
+                indices = ()
+        return indices
+
+    def finditer(self, text: str, pos: int = 0, endpos: Optional[int] = None) -> Iterator[Tuple[int, Tuple[int, ...]]]:
+        """(시작 위치, 일치한 단어 인덱스들)을 텍스트 순서대로 반환
+
+        pos는 text[pos:endpos]를 따로 잘라 검색한 것처럼 문자열 시작으로 본다
+        (원문 뷰로 넘긴 챕터가 잘라 낸 챕터와 같은 결과를 내도록).
+        """
+        if self.pattern is None:
+            return
+        if endpos is None:
+            endpos = len(text)
+        if 0 < pos < endpos and _WORD_CHAR.match(text, pos - 1):
+            # pos 앞이 단어 문자면 \b가 그 문자를 보므로 pos 위치만 문자열 시작 기준으로 따로 확인
+            m = self._start_pattern.match(text, pos, endpos)
+            if m is not None:
+                yield pos, self._lookup(m.group(1))
+            pos += 1
+        for m in self.pattern.finditer(text, pos, endpos):
+            yield m.start(), self._lookup(m.group(1))
+
+def _assign_hits(matcher: LexiconMatcher, text: str, spans: List[Tuple[int, int]]) -> Dict[int, Set[int]]:
+    """매처의 일치 결과를 문장 인덱스별 단어 인덱스 집합으로 모음 (spans 범위만 스캔)"""
+    hits = defaultdict(set)
+    starts = [s for s, _ in spans]
+    lengths = matcher.lengths
+    for start, indices in matcher.finditer(text, spans[0][0], spans[-1][1]):
+        sent_idx = bisect_right(starts, start) - 1
+        if sent_idx < 0:
+            continue
+        sent_end = spans[sent_idx][1]
+        if start >= sent_end:
+            continue
+        for idx in indices:
+            # 문장 구분자를 넘어가는 일치는 문장 단위 검색에서 보이지 않는다
+            if start + lengths[idx] <= sent_end:
+                hits[sent_idx].add(idx)
+    return hits
+
+# === 컴파일된 사전 캐시 ===
+# 프로세스 단위로 유지되므로 청크/챕터/연속된 분석 요청 사이에서 재사용된다
+MATCHER_CACHE_SIZE = 32
+
+class CompiledLexicon:
+    """인물 목록과 감정어 목록에 대해 컴파일된 매처 묶음"""
+
+    def __init__(self, characters: Tuple[str, ...], emotions: Tuple[str, ...], particles: bool = False):
+        self.characters = characters
+        self.emotions = emotions
+        self.char_matcher = LexiconMatcher(list(characters), particles)
+        self.emotion_matcher = LexiconMatcher(list(emotions), particles)
+        self._legacy_patterns = None
+
+    @property
+    def legacy_patterns(self) -> Tuple[Dict[str, re.Pattern], Dict[str, re.Pattern]]:
+        """legacy 엔진용 단어별 정규식 (처음 요청될 때 컴파일)"""
+        if self._legacy_patterns is None:
+            char_patterns = {char: re.compile(r'\b' + re.escape(char) + r'\b', re.IGNORECASE) for char in self.characters}
+            emotion_patterns = {emo: re.compile(r'\b' + re.escape(emo) + r'\b', re.IGNORECASE) for emo in self.emotions}
+            self._legacy_patterns = (char_patterns, emotion_patterns)
+        return self._legacy_patterns
+
+class MatcherCache:
+    """(인물 목록, 감정어 목록, 조사 허용 여부) 키로 CompiledLexicon을 보관하는 LRU 캐시"""
+
+    def __init__(self, maxsize: int = MATCHER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, characters: List[str], emotions: List[str], particles: bool = False) -> CompiledLexicon:
+        key = (tuple(characters), tuple(emotions), particles)
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        # 컴파일은 잠금 밖에서 수행 (다른 키 조회를 막지 않도록)
+        compiled = CompiledLexicon(*key)
+        with self._lock:
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > max(self.maxsize, 0):
+                self._entries.popitem(last=False)
+        return compiled
+
+    def info(self) -> Dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+_matcher_cache = MatcherCache()
+
+def get_compiled_lexicon(characters: List[str], emotions: List[str], particles: bool = False) -> CompiledLexicon:
+    """캐시된 CompiledLexicon 반환 (없으면 컴파일 후 캐시에 저장)"""
+    return _matcher_cache.get(characters, emotions, particles)
+
+def matcher_cache_info() -> Dict:
+    """매처 캐시 적중/실패 횟수와 현재 크기"""
+    return _matcher_cache.info()
+
+def clear_matcher_cache():
+    _matcher_cache.clear()
+
+# === 관계 저장소 ===
+class RelationStore:
+    """추출된 관계를 열(column) 배열로 보관하는 압축 저장소
+
+    인물/감정어는 characters/emotions 목록의 인덱스로, 챕터 제목과 문장은
+    각각 한 번만 저장한 뒤 ID로 참조한다. 한 문장에서 나온 관계 여러 개가
+    같은 문장 문자열을 공유하므로 관계 수만큼 문장이 복사되지 않는다.
+    """
+    __slots__ = ("characters", "emotions", "chapters", "sentences",
+                 "src", "dst", "attitude", "sentence", "chapter")
+
+    def __init__(self, characters: List[str], emotions: List[str]):
+        self.characters = list(characters)
+        self.emotions = list(emotions)
+        self.chapters: List[str] = []
+        self.sentences: List[str] = []
+        self.src = array('i')
+        self.dst = array('i')
+        self.attitude = array('i')
+        self.sentence = array('i')
+        self.chapter = array('i')
+
+    def add_chapter(self, title: str) -> int:
+        self.chapters.append(sys.intern(title))
+        return len(self.chapters) - 1
+
+    def add_sentence(self, chapter_id: int, sentence: str, present: List[int], emotion_ids: List[int]):
+        """한 문장의 관계 추가: 첫 번째 인물 -> 나머지 인물, 감정어마다 하나씩"""
+        sentence_id = len(self.sentences)
+        self.sentences.append(sentence)
+        source = present[0]
+        for emo_idx in emotion_ids:
+            for target in present[1:]:
+                self.src.append(source)
+                self.dst.append(target)
+                self.attitude.append(emo_idx)
+                self.sentence.append(sentence_id)
+                self.chapter.append(chapter_id)
+
+    def add_pairs(self, chapter_id: int, sentence: str, source: int, pairs: List[Tuple[int, int]]):
+        """한 문장(창)의 관계 추가: source -> 받는 인물, (감정어, 받는 인물) 쌍마다 하나씩"""
+        sentence_id = len(self.sentences)
+        self.sentences.append(sentence)
+        for emo_idx, target in pairs:
+            self.src.append(source)
+            self.dst.append(target)
+            self.attitude.append(emo_idx)
+            self.sentence.append(sentence_id)
+            self.chapter.append(chapter_id)
+
+    def extend(self, other: "RelationStore"):
+        """같은 인물/감정어 목록으로 만든 다른 저장소를 뒤에 이어 붙임"""
+        chapter_offset = len(self.chapters)
+        sentence_offset = len(self.sentences)
+        self.chapters.extend(other.chapters)
+        self.sentences.extend(other.sentences)
+        self.src.extend(other.src)
+        self.dst.extend(other.dst)
+        self.attitude.extend(other.attitude)
+        self.sentence.extend(array('i', (s + sentence_offset for s in other.sentence)) if sentence_offset else other.sentence)
+        self.chapter.extend(array('i', (c + chapter_offset for c in other.chapter)) if chapter_offset else other.chapter)
+
+    def __len__(self) -> int:
+        return len(self.src)
+
+    def __getitem__(self, i: int) -> Dict:
+        return {
+            "from": self.characters[self.src[i]],
+            "to": self.characters[self.dst[i]],
+            "attitude": self.emotions[self.attitude[i]],
+            "sentence": self.sentences[self.sentence[i]],
+            "chapter": self.chapters[self.chapter[i]]
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self.src)):
+            yield self[i]
+
+    def to_dicts(self) -> List[Dict]:
+        """기존 list-of-dicts 형식으로 변환 (하위 호환용)"""
+        return list(self)
+
+# === 관계 조회 색인 (필터·정렬·페이지) ===
+RELATION_SORT_KEYS = ("order", "from", "to", "attitude", "chapter")
+
+class RelationIndex:
+    """RelationStore 위의 조회용 색인: (from, to) 쌍, 챕터, 감정어 -> 관계 행 번호 배열
+
+    행 번호 배열은 오름차순(본문 순서)이므로 필터 결과도 본문 순서를 유지한다.
+    한 페이지에 필요한 행만 dict로 만들어 돌려준다.
+    """
+
+    def __init__(self, store: RelationStore):
+        self.store = store
+        self.by_pair: Dict[Tuple[int, int], array] = defaultdict(lambda: array('i'))
+        self.by_chapter: Dict[int, array] = defaultdict(lambda: array('i'))
+        self.by_attitude: Dict[int, array] = defaultdict(lambda: array('i'))
+        for row, (src, dst, att, chapter) in enumerate(zip(store.src, store.dst, store.attitude, store.chapter)):
+            self.by_pair[(src, dst)].append(row)
+            self.by_chapter[chapter].append(row)
+            self.by_attitude[att].append(row)
+        self.by_pair = dict(self.by_pair)
+        self.by_chapter = dict(self.by_chapter)
+        self.by_attitude = dict(self.by_attitude)
+        # 이름 정렬용 순위 (같은 이름이면 본문 순서)
+        self._name_rank = {
+            "from": (self._ranks(store.characters), store.src),
+            "to": (self._ranks(store.characters), store.dst),
+            "attitude": (self._ranks(store.emotions), store.attitude)
+        }
+
+    @staticmethod
+    def _ranks(names: List[str]) -> List[int]:
+        order = sorted(range(len(names)), key=lambda i: names[i])
+        ranks = [0] * len(names)
+        for rank, i in enumerate(order):
+            ranks[i] = rank
+        return ranks
+
+    def _ids(self, names: List[str], value: Optional[str]) -> Optional[List[int]]:
+        # 같은 이름이 여러 번 있을 수 있으므로 해당하는 모든 ID
+        if value is None:
+            return None
+        return [i for i, name in enumerate(names) if name == value]
+
+    def rows(
+        self,
+        source: Optional[str] = None,
+        target: Optional[str] = None,
+        attitude: Optional[str] = None,
+        chapter: Optional[str] = None,
+        sort: str = "order",
+        descending: bool = False
+    ) -> List[int]:
+        """필터에 맞는 행 번호를 정렬 순서대로 반환"""
+        if sort not in RELATION_SORT_KEYS:
+            raise ValueError(f"알 수 없는 정렬 기준입니다: {sort} (사용 가능: {', '.join(RELATION_SORT_KEYS)})")
+        store = self.store
+        src_ids = self._ids(store.characters, source)
+        dst_ids = self._ids(store.characters, target)
+        postings = []
+        if src_ids is not None or dst_ids is not None:
+            postings.append([self.by_pair[pair] for pair in self.by_pair
+                             if (src_ids is None or pair[0] in src_ids) and (dst_ids is None or pair[1] in dst_ids)])
+        att_ids = self._ids(store.emotions, attitude)
+        if att_ids is not None:
+            postings.append([self.by_attitude[i] for i in att_ids if i in self.by_attitude])
+        chapter_ids = self._ids(store.chapters, chapter)
+        if chapter_ids is not None:
+            postings.append([self.by_chapter[i] for i in chapter_ids if i in self.by_chapter])
+
+        if not postings:
+            rows = list(range(len(store)))
+        else:
+            # 필터별 행 집합의 교집합: 가장 작은 쪽을 기준으로 나머지에 들어 있는지 확인
+            candidates = sorted((sorted(set().union(*arrays)) if len(arrays) != 1 else list(arrays[0])
+                                 for arrays in postings), key=len)
+            rows = candidates[0]
+            for other in candidates[1:]:
+                other = set(other)
+                rows = [row for row in rows if row in other]
+
+        if sort == "chapter":
+            # 챕터 ID는 본문 순서이므로 행 번호 순서와 같다
+            sort = "order"
+        if sort == "order":
+            return rows[::-1] if descending else rows
+        ranks, column = self._name_rank[sort]
+        rows.sort(key=lambda row: ranks[column[row]], reverse=descending)
+        return rows
+
+    def page(self, rows: List[int], offset: int = 0, limit: int = 50) -> List[Dict]:
+        return [{"id": row, **self.store[row]} for row in rows[offset:offset + limit]]
+
+# === 열 기반 결과 파일 (메모리 맵) ===
+# 구조: [매직][열 배열 int32 x 5][문장 오프셋 int64][문장 UTF-8 바이트][JSON 꼬리말][꼬리말 길이 uint64][매직]
+# 열과 문장은 분석이 끝난 배열 그대로 쓰고, 읽을 때는 메모리 맵 위의 memoryview로 복사 없이 연다.
+# 노트북에서는 np.asarray(relations.src)처럼 numpy 배열로도 복사 없이 감쌀 수 있다.
+RELATIONS_FILE_MAGIC = b"LTREL001"
+RELATIONS_FILE_SUFFIX = ".rel"
+RELATION_COLUMNS = ("src", "dst", "attitude", "sentence", "chapter")
+# 결과에 있으면 푸터에 함께 싣는 집계 (없는 옛 파일도 읽을 수 있다)
+RELATIONS_FILE_AGGREGATES = ("chapter_emotion_matrix", "emotion_balance")
+
+class _HashingWriter:
+    """쓰는 바이트 수와 sha256을 함께 계산하는 파일 래퍼"""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.digest = hashlib.sha256()
+        self.written = 0
+
+    def write(self, data) -> int:
+        data = memoryview(data).cast("B")
+        self.fp.write(data)
+        self.digest.update(data)
+        self.written += len(data)
+        return len(data)
+
+def _column_bytes(values, typecode: str):
+    column = values if isinstance(values, array) and values.typecode == typecode else array(typecode, values)
+    if sys.byteorder != "little":
+        column = array(typecode, column)
+        column.byteswap()
+    return column
+
+def write_relations_file(result: Dict, fp) -> int:
+    """compact=True 분석 결과를 열 기반 바이너리 형식으로 fp(바이너리 파일)에 기록하고 바이트 수 반환"""
+    relations = result["relations"]
+    if not hasattr(relations, "src"):
+        raise TypeError("열 기반 결과 파일은 compact=True로 얻은 RelationStore 결과만 기록할 수 있습니다.")
+    writer = fp if isinstance(fp, _HashingWriter) else _HashingWriter(fp)
+    start = writer.written
+    layout = {}
+
+    def align():
+        padding = -(writer.written - start) % 8
+        if padding:
+            writer.write(b"\0" * padding)
+
+    writer.write(RELATIONS_FILE_MAGIC)
+    for name in RELATION_COLUMNS:
+        layout[name] = writer.written - start
+        writer.write(_column_bytes(getattr(relations, name), "i"))
+    align()
+
+    # 문장은 하나씩 인코딩해 쓰고 오프셋만 모아 둔다
+    sentence_offsets = array('q', [0])
+    sentence_data = writer.written - start
+    for sentence in relations.sentences:
+        encoded = sentence.encode("utf-8", "surrogatepass")
+        writer.write(encoded)
+        sentence_offsets.append(sentence_offsets[-1] + len(encoded))
+    align()
+    layout["sentence_offsets"] = writer.written - start
+    writer.write(_column_bytes(sentence_offsets, "q"))
+
+    footer = json.dumps({
+        "rows": len(relations),
+        "columns": layout,
+        "sentence_data": sentence_data,
+        "sentence_count": len(sentence_offsets) - 1,
+        "characters": list(relations.characters),
+        "emotions": list(relations.emotions),
+        "chapters": list(relations.chapters),
+        "chapter_emotions": result["chapter_emotions"],
+        "summary_relations": result["summary_relations"],
+        **{key: result[key] for key in RELATIONS_FILE_AGGREGATES if key in result}
+    }, ensure_ascii=False).encode("utf-8")
+    writer.write(footer)
+    writer.write(len(footer).to_bytes(8, "little"))
+    writer.write(RELATIONS_FILE_MAGIC)
+    return writer.written - start
+
+def save_relations_file(result: Dict, directory: str) -> str:
+    """결과를 내용 해시(sha256) 이름의 파일로 저장하고 경로 반환 (같은 결과는 같은 파일)"""
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "wb") as f:
+        writer = _HashingWriter(f)
+        write_relations_file(result, writer)
+    path = os.path.join(directory, writer.digest.hexdigest() + RELATIONS_FILE_SUFFIX)
+    os.replace(tmp_path, path)
+    return path
+
+class _MappedSentences:
+    """문장 오프셋으로 필요한 문장만 디코딩하는 읽기 전용 목록"""
+
+    def __init__(self, data: memoryview, offsets):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        return str(self._data[self._offsets[i]:self._offsets[i + 1]], "utf-8", "surrogatepass")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+class MappedRelations(RelationStore):
+    """열 기반 결과 파일을 메모리 맵으로 연 읽기 전용 관계 저장소
+
+    열(src, dst, attitude, sentence, chapter)은 파일을 가리키는 memoryview이고
+    문장은 요청될 때만 디코딩하므로, 여는 비용은 관계 수와 무관하다.
+    """
+    __slots__ = ("path", "_mmap")
+
+    def __init__(self, path: str, footer: Dict, mm: mmap.mmap):
+        self.path = path
+        self._mmap = mm
+        self.characters = footer["characters"]
+        self.emotions = footer["emotions"]
+        self.chapters = footer["chapters"]
+        view = memoryview(mm)
+        rows = footer["rows"]
+        for name in RELATION_COLUMNS:
+            setattr(self, name, self._column(view, footer["columns"][name], rows, "i"))
+        offsets = self._column(view, footer["columns"]["sentence_offsets"], footer["sentence_count"] + 1, "q")
+        data_start = footer["sentence_data"]
+        self.sentences = _MappedSentences(view[data_start:data_start + offsets[-1]], offsets)
+
+    @staticmethod
+    def _column(view: memoryview, offset: int, count: int, typecode: str):
+        size = array(typecode).itemsize
+        column = view[offset:offset + count * size]
+        if sys.byteorder == "little":
+            return column.cast(typecode)
+        # 빅엔디언 환경에서는 복사해서 바이트 순서를 바꾼다
+        copied = array(typecode, column.tobytes())
+        copied.byteswap()
+        return copied
+
+    def add_chapter(self, title: str) -> int:
+        raise TypeError("메모리 맵 결과는 읽기 전용입니다.")
+
+    def add_sentence(self, chapter_id: int, sentence: str, present: List[int], emotion_ids: List[int]):
+        raise TypeError("메모리 맵 결과는 읽기 전용입니다.")
+
+    def add_pairs(self, chapter_id: int, sentence: str, source: int, pairs: List[Tuple[int, int]]):
+        raise TypeError("메모리 맵 결과는 읽기 전용입니다.")
+
+    def extend(self, other: RelationStore):
+        raise TypeError("메모리 맵 결과는 읽기 전용입니다.")
+
+def load_relations_file(path: str) -> Dict:
+    """열 기반 결과 파일을 메모리 맵으로 열어 run_analysis(compact=True)와 같은 형식으로 반환"""
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic_size = len(RELATIONS_FILE_MAGIC)
+    if len(mm) < magic_size * 2 + 8 or mm[:magic_size] != RELATIONS_FILE_MAGIC or mm[-magic_size:] != RELATIONS_FILE_MAGIC:
+        mm.close()
+        raise ValueError(f"열 기반 결과 파일이 아니거나 손상되었습니다: {path}")
+    footer_end = len(mm) - magic_size - 8
+    footer_size = int.from_bytes(mm[footer_end:footer_end + 8], "little")
+    footer = json.loads(mm[footer_end - footer_size:footer_end].decode("utf-8"))
+    return {
+        "relations": MappedRelations(path, footer, mm),
+        "chapter_emotions": footer["chapter_emotions"],
+        "summary_relations": footer["summary_relations"],
+        **{key: footer[key] for key in RELATIONS_FILE_AGGREGATES if key in footer}
+    }
 
 # === 관계 추출 최적화 ===
-def extract_relations(text: str, characters: List[str], emotions: List[str], chapter_title: str) -> List[Dict]:
-    """한 챕터 내에서 등장인물 관계 추출"""
-    relations = []
-    sentences = split_sentences(text)
-    
-    # 인물 이름 패턴 미리 컴파일
-    char_patterns = {char: re.compile(r'\b' + re.escape(char) + r'\b', re.IGNORECASE) for char in characters}
-    emotion_patterns = {emo: re.compile(r'\b' + re.escape(emo) + r'\b', re.IGNORECASE) for emo in emotions}
+def extract_relations(
+    text: str,
+    characters: List[str],
+    emotions: List[str],
+    chapter_title: str,
+    matcher: str = DEFAULT_MATCHER,
+    sentence_spans: Optional[List[Tuple[int, int]]] = None,
+    window: int = 1
+) -> List[Dict]:
+    """한 챕터 내에서 등장인물 관계 추출
+
+    sentence_spans가 주어지면 문장을 다시 나누지 않고 해당 오프셋의 문장만 분석한다.
+    window가 2 이상이면 연속한 window개 문장을 하나로 보고 관계를 찾는다 (SentenceWindow 참조).
+    """
+    _check_window(window, matcher)
+    store = RelationStore(characters, emotions)
+    _extract_into(store, store.add_chapter(chapter_title), text, matcher, sentence_spans,
+                  SentenceWindow(window) if window > 1 else None)
+    return store.to_dicts()
+
+def _extract_into(
+    store: RelationStore,
+    chapter_id: int,
+    text: str,
+    matcher: str = DEFAULT_MATCHER,
+    sentence_spans: Optional[List[Tuple[int, int]]] = None,
+    window: Optional["SentenceWindow"] = None
+):
+    """관계를 dict로 만들지 않고 저장소에 바로 추가 (window가 주어지면 청크가 바뀌어도 창이 이어진다)"""
+    if matcher not in MATCHER_ENGINES:
+        raise ValueError(f"알 수 없는 매처 엔진입니다: {matcher} (사용 가능: {', '.join(MATCHER_ENGINES)})")
+    spans = sentence_spans if sentence_spans is not None else split_sentence_spans(text)
+    if not spans:
+        return
+    compiled = get_compiled_lexicon(store.characters, store.emotions)
+    if window is not None:
+        for sent, source, pairs in window.feed(compiled, text, spans):
+            store.add_pairs(chapter_id, sent, source, pairs)
+        return
+    if matcher == "legacy":
+        hits = _sentence_hits_legacy(compiled, [text[s:e] for s, e in spans])
+    else:
+        hits = _sentence_hits(compiled, text, spans)
+    for sent, present, emotion_ids in hits:
+        store.add_sentence(chapter_id, sent, present, emotion_ids)
+
+def _sentence_hits(compiled: CompiledLexicon, text: str, spans: List[Tuple[int, int]]) -> Generator[Tuple[str, List[int], List[int]], None, None]:
+    """관계가 성립하는 문장마다 (문장, 등장인물 인덱스, 감정어 인덱스)를 생성"""
+    # 챕터 전체를 인물/감정어별로 한 번씩만 스캔
+    char_hits = _assign_hits(compiled.char_matcher, text, spans)
+    if not char_hits:
+        return
+    emotion_hits = _assign_hits(compiled.emotion_matcher, text, spans)
+
+    for sent_idx in sorted(char_hits):
+        present_idx = char_hits[sent_idx]
+        if len(present_idx) < 2 or sent_idx not in emotion_hits:
+            continue
+        start, end = spans[sent_idx]
+        sent = text[start:end].strip()
+        if not sent:
+            continue
+        yield sent, sorted(present_idx), sorted(emotion_hits[sent_idx])
+
+def _sentence_hits_legacy(compiled: CompiledLexicon, sentences: List[str]) -> Generator[Tuple[str, List[int], List[int]], None, None]:
+    """단어별 정규식을 문장마다 검사하는 기존 방식 (비교용)"""
+    # 인물 이름 패턴은 캐시에서 재사용
+    char_patterns, emotion_patterns = compiled.legacy_patterns
     
-    for sent_idx, sent in enumerate(sentences):
+    for sent in sentences:
         if not sent.strip():  # 빈 문장 건너뛰기
             continue
             
         # 각 문장에 어떤 캐릭터가 존재하는지 확인
-        present = []
-        for char in characters:
-            if char_patterns[char].search(sent):
-                present.append(char)
-                
+        present = [i for i, char in enumerate(compiled.characters) if char_patterns[char].search(sent)]
         if len(present) < 2:
             continue
             
         # 감정어 확인
-        for emo in emotions:
-            if emotion_patterns[emo].search(sent):
-                source = present[0]
-                for target in present[1:]:
-                    relations.append({
-                        "from": source,
-                        "to": target,
-                        "attitude": emo,
-                        "sentence": sent.strip(),
-                        "chapter": chapter_title
-                    })
-                    
-    return relations
+        emotion_ids = [i for i, emo in enumerate(compiled.emotions) if emotion_patterns[emo].search(sent)]
+        if emotion_ids:
+            yield sent.strip(), present, emotion_ids
+
+# === 여러 문장 창 (슬라이딩 윈도) ===
+def _check_window(window: int, matcher: str):
+    if window < 1:
+        raise ValueError(f"문장 창 크기는 1 이상이어야 합니다: {window}")
+    if window > 1 and matcher == "legacy":
+        raise ValueError("문장 창(window > 1)은 combined 매처에서만 사용할 수 있습니다.")
+
+class SentenceWindow:
+    """연속한 size개 문장을 하나로 보고 관계를 찾는 슬라이딩 창
+
+    창이 문장 하나씩 밀릴 때 들어오는 문장의 인물·감정어를 더하고 나가는 문장의 것을 빼서
+    창 안의 인물·감정어 집합(등장 문장 수)을 유지하므로 창마다 다시 훑지 않는다.
+    새로 들어온 문장 하나만으로 관계가 성립하면 문장 단위와 똑같이 기록하고(그래서 창을 넓혀도
+    문장 단위에서 찾은 관계는 그대로 남는다), 여러 문장에 걸친 관계는 문장 단위와 같은 규칙
+    (창 안에서 목록 순서가 가장 앞선 인물 -> 나머지 인물, 감정어마다 하나)으로 만들되
+    새로 들어온 문장의 인물이나 감정어가 들어간 관계만 기록한다.
+    (보낸 인물, 받는 인물, 감정어)마다 마지막으로 기록한 근거 문장들 중 가장 앞선 문장 번호를 두고,
+    그 근거가 모두 아직 창 안에 있으면 여러 문장에 걸친 같은 관계는 다시 기록하지 않는다.
+    일치가 있는 문장만 처리하므로 비용은 창 크기와 관계없이 텍스트 길이(와 기록하는 관계 수)에 비례한다.
+    size=1이면 문장 단위 분석과 결과가 같다. 여러 문장에 걸친 관계의 문장은 창 안에서 일치가 있는
+    첫 문장부터 새로 들어온 문장까지의 원문이다.
+    """
+
+    def __init__(self, size: int):
+        if size < 1:
+            raise ValueError(f"문장 창 크기는 1 이상이어야 합니다: {size}")
+        self.size = size
+        self._recent = deque()  # (문장 번호, 시작 오프셋, 인물 인덱스, 감정어 인덱스) - 일치가 있는 문장만
+        self._characters: Dict[int, int] = {}  # 인물 인덱스 -> 창 안에서 등장한 문장 수
+        self._emotions: Dict[int, int] = {}
+        self._last_character: Dict[int, int] = {}  # 인물 인덱스 -> 마지막으로 등장한 문장 번호
+        self._last_emotion: Dict[int, int] = {}
+        self._seen = 0  # 앞 청크까지의 문장 수 (문장 번호 기준)
+        self._recorded: Dict[Tuple[int, int, int], int] = {}  # (보낸 인물, 받는 인물, 감정어) -> 마지막 기록 근거의 첫 문장 번호
+
+    @staticmethod
+    def _count(counts: Dict[int, int], indices, delta: int):
+        for idx in indices:
+            remaining = counts.get(idx, 0) + delta
+            if remaining:
+                counts[idx] = remaining
+            else:
+                del counts[idx]
+
+    def push(self, number: int, start: int, characters: Set[int], emotions: Set[int]) -> List[Tuple[int, int, List[Tuple[int, int]]]]:
+        """number번 문장을 창에 넣고 새로 생긴 관계를 [(근거 시작 오프셋, 보낸 인물, [(감정어, 받는 인물)])]로 반환"""
+        while self._recent and self._recent[0][0] <= number - self.size:
+            _, _, old_characters, old_emotions = self._recent.popleft()
+            self._count(self._characters, old_characters, -1)
+            self._count(self._emotions, old_emotions, -1)
+        self._recent.append((number, start, characters, emotions))
+        self._count(self._characters, characters, 1)
+        self._count(self._emotions, emotions, 1)
+        for idx in characters:
+            self._last_character[idx] = number
+        for idx in emotions:
+            self._last_emotion[idx] = number
+        recorded = self._recorded
+        found = []
+
+        # 새 문장 하나만으로 성립하는 관계: 문장 단위와 같게 항상 기록
+        local = set()
+        if len(characters) >= 2 and emotions:
+            ordered = sorted(characters)
+            source, targets = ordered[0], ordered[1:]
+            pairs = [(emo, target) for emo in sorted(emotions) for target in targets]
+            for emo, target in pairs:
+                recorded[(source, target, emo)] = number
+                local.add((source, target, emo))
+            found.append((start, source, pairs))
+        if len(self._characters) < 2 or not self._emotions:
+            return found
+
+        source = min(self._characters)
+        targets = sorted(self._characters)
+        targets.remove(source)
+        if source in characters:
+            pairs = [(emo, target) for emo in sorted(self._emotions) for target in targets]
+        else:
+            # 새 문장의 인물이 받는 쪽이거나 새 문장의 감정어인 관계만
+            new_pairs = {(emo, target) for target in characters if target != source for emo in self._emotions}
+            new_pairs.update((emo, target) for emo in emotions for target in targets)
+            pairs = sorted(new_pairs)
+        # 마지막으로 기록한 근거 문장이 모두 아직 창 안에 있는 관계는 건너뛴다
+        oldest = number - self.size
+        fresh = []
+        for emo, target in pairs:
+            key = (source, target, emo)
+            if key in local or recorded.get(key, oldest) > oldest:
+                continue
+            recorded[key] = min(self._last_character[source], self._last_character[target], self._last_emotion[emo])
+            fresh.append((emo, target))
+        if fresh:
+            found.append((self._recent[0][1], source, fresh))
+        return found
+
+    def feed(self, compiled: CompiledLexicon, text: str, spans: List[Tuple[int, int]]) -> Generator[Tuple[str, int, List[Tuple[int, int]]], None, None]:
+        """이어지는 문장 청크를 넣으며 (근거 원문, 보낸 인물, [(감정어, 받는 인물)])을 생성"""
+        char_hits = _assign_hits(compiled.char_matcher, text, spans)
+        # 인물이 없는 문장의 감정어도 창 안의 다른 문장 인물과 관계를 이룰 수 있다
+        emotion_hits = _assign_hits(compiled.emotion_matcher, text, spans)
+        base = self._seen
+        self._seen += len(spans)
+        for sent_idx in sorted(char_hits.keys() | emotion_hits.keys()):
+            start, end = spans[sent_idx]
+            found = self.push(base + sent_idx, start, char_hits.get(sent_idx, set()), emotion_hits.get(sent_idx, set()))
+            for evidence_start, source, pairs in found:
+                yield text[evidence_start:end].strip(), source, pairs
+
+# === 단계별 시간 측정 ===
+# 분석 단계: 챕터 분할, 문장 분할, 인물·감정어 매칭, 집계, 결과 직렬화
+ANALYSIS_STAGES = ("chapter_split", "sentence_split", "matching", "aggregation", "serialization")
+
+class StageProfiler:
+    """분석 단계별 누적 시간(초)
+
+    분석 함수에 profiler로 넘기면 챕터·청크 단위로 시간을 잰다 (문장마다 재지 않으므로
+    오버헤드는 챕터당 몇 번의 시각 읽기뿐이다). 넘기지 않으면(None) 시간을 재지 않는다.
+    병렬 모드의 문장 분할·매칭 시간은 작업자 프로세스 시간의 합이다.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = dict.fromkeys(ANALYSIS_STAGES, 0.0)
+
+    def add(self, stage: str, seconds: float):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def merge(self, seconds: Dict[str, float]):
+        """다른 프로세스에서 잰 단계별 시간을 더함"""
+        for stage, value in seconds.items():
+            self.add(stage, value)
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def timed(self, iterable: Iterable, stage: str) -> Generator:
+        """iterable의 항목을 하나씩 꺼내는 데 걸린 시간을 stage에 누적 (지연 분할용)"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - start)
+                return
+            self.add(stage, time.perf_counter() - start)
+            yield item
+
+    def snapshot(self) -> Dict[str, float]:
+        return {stage: round(seconds, 6) for stage, seconds in list(self.seconds.items())}
+
+def _stage(profiler: Optional[StageProfiler], stage: str):
+    return profiler.stage(stage) if profiler is not None else nullcontext()
 
 # === 분석 진행 상황 추적 클래스 ===
 class ProgressTracker:
-    def __init__(self, total_chapters=0):
+    """챕터가 끝날 때마다 진행률, 처리 속도, 남은 시간을 계산
+
+    진행률은 챕터 크기(문자열 입력은 문자 수, 파일 입력은 바이트 수)로 가중하므로 큰 챕터 하나가
+    끝날 때까지 멈춰 있지 않고 크기만큼 나아간다. total_size가 0이면 챕터 수 기준이다.
+    total_chapters가 None이면(파일을 읽기 전이라 챕터 수를 모름) 크기 기준으로만 계산한다.
+    """
+
+    def __init__(self, total_chapters=0, total_size=0, profiler: Optional[StageProfiler] = None):
         self.total_chapters = total_chapters
+        self.total_size = total_size
         self.processed_chapters = 0
+        self.processed_size = 0
         self.relations_count = 0
+        self.profiler = profiler
+        self.started = time.perf_counter()
         
-    def update(self, chapter_title, new_relations):
+    def update(self, chapter_title, new_relations, size=0):
         self.processed_chapters += 1
+        self.processed_size += size
         self.relations_count += len(new_relations)
-        progress = (self.processed_chapters / self.total_chapters) * 100 if self.total_chapters > 0 else 0
-        logger.info(f"처리 중: {chapter_title} 완료 ({self.processed_chapters}/{self.total_chapters}, {progress:.1f}%, 관계 {self.relations_count}개 발견)")
-        return {
+        if self.total_size > 0:
+            progress = min(self.processed_size / self.total_size, 1.0) * 100
+        else:
+            progress = (self.processed_chapters / self.total_chapters) * 100 if self.total_chapters else 0
+        elapsed = time.perf_counter() - self.started
+        mb_per_s = self.processed_size / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+        if self.processed_size and self.total_size > self.processed_size:
+            eta_seconds = (self.total_size - self.processed_size) * elapsed / self.processed_size
+        else:
+            eta_seconds = 0.0
+        total = self.total_chapters if self.total_chapters is not None else "?"
+        logger.info(f"처리 중: {chapter_title} 완료 ({self.processed_chapters}/{total}, {progress:.1f}%, "
+                    f"관계 {self.relations_count}개 발견, {mb_per_s:.2f}MB/s, 남은 시간 {eta_seconds:.0f}초)")
+        info = {
             "progress": progress,
             "chapter": chapter_title,
             "processed": self.processed_chapters,
             "total": self.total_chapters,
-            "relations": self.relations_count
+            "relations": self.relations_count,
+            "processed_size": self.processed_size,
+            "total_size": self.total_size,
+            "elapsed": round(elapsed, 3),
+            "mb_per_s": round(mb_per_s, 3),
+            "eta_seconds": round(eta_seconds, 1)
         }
+        if self.profiler is not None:
+            info["stages"] = self.profiler.snapshot()
+        return info
 
-# === 핵심 분석 함수 (최적화) ===
-def run_analysis(
-    text: str,
+# === 챕터 단위 분석 (직렬/병렬) ===
+# 병렬 모드에서 한 번에 작업자에게 넘기는 챕터 묶음의 목표 크기(문자 수)
+PARALLEL_BATCH_CHARS = 1_000_000
+
+def _analyze_chapter(chapter: ChapterView, characters: List[str], emotions: List[str], matcher: str, chunk_size: int,
+                     profiler: Optional[StageProfiler] = None, window: int = 1) -> RelationStore:
+    """한 챕터를 문장 경계에 맞춘 청크 단위로 분석 (문장 분할은 챕터당 한 번, 문장 창은 챕터 안에서만 이어짐)"""
+    title, text, start, end = chapter
+    chapter_relations = RelationStore(characters, emotions)
+    chapter_id = chapter_relations.add_chapter(title)
+    sentence_window = SentenceWindow(window) if window > 1 else None
+    with _stage(profiler, "sentence_split"):
+        spans = split_sentence_spans(text, start, end)
+    with _stage(profiler, "matching"):
+        for chunk_spans in chunk_sentence_spans(spans, chunk_size):
+            _extract_into(chapter_relations, chapter_id, text, matcher, chunk_spans, sentence_window)
+    return chapter_relations
+
+def _analyze_chapter_batch(batch: List[Tuple[str, str]], characters: List[str], emotions: List[str], matcher: str, chunk_size: int,
+                           profile: bool = False, window: int = 1) -> Tuple[List[Tuple[str, RelationStore]], Optional[Dict[str, float]]]:
+    """프로세스 풀 작업 단위: 챕터 묶음을 순서대로 분석 (profile이면 단계별 시간도 반환)"""
+    profiler = StageProfiler() if profile else None
+    results = [
+        (title, _analyze_chapter((title, content, 0, len(content)), characters, emotions, matcher, chunk_size, profiler, window))
+        for title, content in batch
+    ]
+    return results, (profiler.seconds if profiler is not None else None)
+
+def _view_chars(chapter: ChapterView) -> int:
+    """진행률 계산용 챕터 크기 (문자 수)"""
+    return chapter[3] - chapter[2]
+
+def _batch_chapters(chapters: Iterable[ChapterView], batch_chars: int,
+                    chapter_size: Callable[[ChapterView], int] = _view_chars) -> Generator[Tuple[List[Tuple[str, str]], List[int]], None, None]:
+    """작은 챕터들을 묶어 프로세스 간 전송 비용을 줄임 (작업자에게는 챕터 내용만 복사해 보낸다)
+
+    (묶음, 진행률 계산용 챕터 크기 목록)을 생성한다.
+    """
+    batch = []
+    sizes = []
+    batch_size = 0
+    for chapter in chapters:
+        title, text, start, end = chapter
+        batch.append((title, text[start:end]))
+        sizes.append(chapter_size(chapter))
+        batch_size += end - start
+        if batch_size >= batch_chars:
+            yield batch, sizes
+            batch = []
+            sizes = []
+            batch_size = 0
+    if batch:
+        yield batch, sizes
+
+def _analyze_chapters(
+    chapters: Iterable[ChapterView],
     characters: List[str],
-    emotion_lexicon: Dict[str, List[str]],
-    chapter_pattern: str = r"(Letter \d+|Chapter \d+)",
-    progress_callback=None
-) -> Dict:
-    """대용량 텍스트를 처리하도록 최적화된 분석 함수"""
-    # 전체 텍스트 길이 로깅
-    text_mb = len(text) / (1024 * 1024)
-    logger.info(f"텍스트 분석 시작: {text_mb:.2f}MB, 등장인물 {len(characters)}명")
-    
-    # 챕터 수 미리 계산하여 진행률 추적
-    chapter_count = len(re.findall(chapter_pattern, text))
-    if chapter_count == 0:
-        chapter_count = 1  # 챕터 구분이 없는 경우
-        
-    # 진행 상황 추적 초기화
-    tracker = ProgressTracker(chapter_count)
-    
+    emotions: List[str],
+    matcher: str,
+    workers: int,
+    chunk_size: int,
+    on_chapter_done: Callable[[str, RelationStore, int], None],
+    profiler: Optional[StageProfiler] = None,
+    window: int = 1,
+    chapter_size: Callable[[ChapterView], int] = _view_chars
+) -> Generator[Tuple[str, RelationStore], None, None]:
+    """챕터별 (제목, 관계 목록)을 원래 챕터 순서대로 생성
+
+    on_chapter_done(제목, 관계, chapter_size(챕터))은 각 챕터 분석이 끝나는 즉시 호출된다 (병렬 모드에서는 완료 순서).
+    """
+    if workers <= 1:
+        for chapter in chapters:
+            title, _, start, end = chapter
+            logger.info(f"챕터 처리 시작: {title} ({(end - start) / 1024:.1f}KB)")
+            chapter_relations = _analyze_chapter(chapter, characters, emotions, matcher, chunk_size, profiler, window)
+            on_chapter_done(title, chapter_relations, chapter_size(chapter))
+            yield title, chapter_relations
+        return
+
+    logger.info(f"병렬 분석 모드: 작업자 {workers}개")
+    # 진행 중이거나 순서를 기다리는 묶음 수를 제한해 메모리 사용량을 묶어 둔다
+    max_in_flight = workers * 2
+    batches = _batch_chapters(chapters, PARALLEL_BATCH_CHARS, chapter_size)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = {}  # future -> (묶음 순번, 챕터 크기 목록)
+        finished = {}  # 묶음 순번 -> 결과 (순서 대기 중)
+        submitted = 0
+        next_seq = 0
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) + len(finished) < max_in_flight:
+                item = next(batches, None)
+                if item is None:
+                    exhausted = True
+                    break
+                batch, sizes = item
+                future = pool.submit(_analyze_chapter_batch, batch, characters, emotions, matcher, chunk_size,
+                                     profiler is not None, window)
+                pending[future] = (submitted, sizes)
+                submitted += 1
+
+            if not pending and not finished:
+                break
+
+            if pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    seq, sizes = pending.pop(future)
+                    results, seconds = future.result()
+                    if seconds is not None:
+                        profiler.merge(seconds)
+                    for (title, chapter_relations), size in zip(results, sizes):
+                        on_chapter_done(title, chapter_relations, size)
+                    finished[seq] = results
+
+            # 챕터 순서대로 병합
+            while next_seq in finished:
+                for item in finished.pop(next_seq):
+                    yield item
+                next_seq += 1
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+# === 챕터 결과 디스크 캐시 ===
+# 관계 추출 결과가 달라지는 변경(매처, 문장 분할 규칙 등)이 있으면 올려서 기존 캐시를 무효화
+MATCHER_VERSION = 4
+CHAPTER_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+class ChapterCache:
+    """(챕터 내용, 인물 목록, 감정어 목록, 매처 버전)의 해시로 챕터별 관계를 디스크에 보관
+
+    챕터 제목은 키에 넣지 않으므로 앞에 챕터가 추가되어 번호가 바뀌어도 재사용된다.
+    감정어별 개수는 저장된 관계에서 다시 집계한다. 전체 크기가 max_bytes를 넘으면
+    가장 오래 사용하지 않은 파일부터 지운다 (사용 시각은 파일 수정 시각으로 기록).
+    """
+
+    def __init__(self, directory: str, max_bytes: int = CHAPTER_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(size for _, _, size in self._entries())
+
+    def lexicon_digest(self, characters: List[str], emotions: List[str], matcher: str, window: int = 1):
+        """챕터 내용을 이어서 넣을 해시 객체 (사전 부분은 분석 한 번에 한 번만 계산)"""
+        # 문장 단위(window=1) 결과의 키는 문장 창 도입 전과 같게 유지
+        header = json.dumps([MATCHER_VERSION, matcher, characters, emotions] + ([window] if window > 1 else []), ensure_ascii=False)
+        digest = hashlib.sha256(header.encode("utf-8"))
+        digest.update(b"\0")
+        return digest
+
+    def key(self, lexicon_digest, text: str, start: int, end: int) -> str:
+        digest = lexicon_digest.copy()
+        digest.update(text[start:end].encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".pkl")
+
+    def get(self, key: str) -> Optional[RelationStore]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                chapter_relations = pickle.load(f)
+            os.utime(path)  # LRU 순서 갱신
+        except (OSError, pickle.UnpicklingError, EOFError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return chapter_relations
+
+    def put(self, key: str, chapter_relations: RelationStore):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 다른 스레드/프로세스가 읽는 중이어도 안전하도록 임시 파일에 쓴 뒤 교체
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(chapter_relations, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.total_bytes += os.path.getsize(path)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> List[Tuple[float, str, int]]:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".pkl"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def _evict(self):
+        # 잠금을 가진 상태에서 호출: 한도의 90%까지 오래된 항목부터 제거
+        entries = sorted(self._entries())
+        self.total_bytes = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self.total_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.total_bytes -= size
+
+    def info(self) -> Dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "bytes": self.total_bytes, "max_bytes": self.max_bytes}
+
+def _analyze_chapters_cached(
+    chapters: Iterable[ChapterView],
+    cache: ChapterCache,
+    characters: List[str],
+    emotions: List[str],
+    matcher: str,
+    workers: int,
+    chunk_size: int,
+    on_chapter_done: Callable[[str, RelationStore, int], None],
+    profiler: Optional[StageProfiler] = None,
+    window: int = 1,
+    chapter_size: Callable[[ChapterView], int] = _view_chars
+) -> Generator[Tuple[str, RelationStore], None, None]:
+    """캐시에 있는 챕터는 불러오고 바뀐 챕터만 분석해 챕터 순서대로 생성"""
+    lexicon_digest = cache.lexicon_digest(characters, emotions, matcher, window)
+    order = deque()  # (제목, 캐시된 결과 또는 None, 키) - 챕터 순서 유지용
+
+    def missing_chapters():
+        for chapter in chapters:
+            title, text, start, end = chapter
+            key = cache.key(lexicon_digest, text, start, end)
+            cached = cache.get(key)
+            if cached is not None:
+                cached.chapters = [title]  # 제목은 키에 포함되지 않으므로 현재 제목으로 교체
+                on_chapter_done(title, cached, chapter_size(chapter))
+            order.append((title, cached, key))
+            if cached is None:
+                yield chapter
+
+    for title, chapter_relations in _analyze_chapters(missing_chapters(), characters, emotions, matcher,
+                                                      workers, chunk_size, on_chapter_done, profiler, window, chapter_size):
+        # 이번 결과보다 앞선 캐시 챕터를 먼저 내보낸다
+        while order[0][1] is not None:
+            cached_title, cached, _ = order.popleft()
+            yield cached_title, cached
+        _, _, key = order.popleft()
+        cache.put(key, chapter_relations)
+        yield title, chapter_relations
+    while order:
+        cached_title, cached, _ = order.popleft()
+        yield cached_title, cached
+    info = cache.info()
+    logger.info(f"챕터 캐시: 적중 {info['hits']}회, 실패 {info['misses']}회, {info['bytes'] / (1024 * 1024):.1f}MB")
+
+# === 관계 집계 ===
+def _name_codes(names: List[str]) -> Tuple[List[str], List[int]]:
+    """이름 목록 -> (중복 없는 이름, 인덱스별 이름 코드) - 같은 이름은 하나로 센다"""
+    codes = {}
+    for name in names:
+        codes.setdefault(name, len(codes))
+    return list(codes), [codes[name] for name in names]
+
+def _int32_column(values) -> np.ndarray:
+    # RelationStore의 array('i')와 메모리 맵 열을 복사 없이 numpy로 본다
+    return np.frombuffer(values, dtype=np.int32) if len(values) else np.zeros(0, dtype=np.int32)
+
+class RelationAggregator:
+    """챕터 결과를 받아 챕터×감정, 인물 쌍×감정 개수를 정수 코드 배열로 누적
+
+    관계 목록을 보관하지 않고, 챕터마다 감정별 개수 한 행과 (쌍, 감정) 코드별
+    (개수, 첫 등장 위치)만 유지한다. 요약과 표는 모두 배열 연산으로 만든다.
+    """
+    # 챕터별 (쌍, 감정) 집계를 이 수만큼 모아서 한 번에 병합
+    MERGE_EVERY = 64
+
+    def __init__(self, characters: List[str], emotions: List[str]):
+        self.characters = characters
+        self.emotions = emotions
+        self.character_names, char_codes = _name_codes(characters)
+        self.emotion_names, emotion_codes = _name_codes(emotions)
+        self._char_codes = np.array(char_codes, dtype=np.int64)
+        self._emotion_codes = np.array(emotion_codes, dtype=np.int64)
+        self._chapter_rows: Dict[str, int] = {}
+        self._chapter_counts: List[np.ndarray] = []
+        self._chapter_order: List[List[int]] = []  # 챕터마다 감정 코드의 첫 등장 순서
+        self._pending = []
+        empty = np.zeros(0, dtype=np.int64)
+        self._pair_totals = (empty, empty, empty)  # (쌍·감정 코드, 첫 등장 위치, 개수)
+        self.relations_count = 0
+
+    def add(self, title: str, chapter_relations: RelationStore) -> Dict[str, int]:
+        """챕터 하나의 관계를 누적하고 그 챕터의 감정어별 개수를 반환"""
+        size = len(chapter_relations)
+        if not size:
+            return {}
+        emotion_count = len(self.emotion_names)
+        attitude = self._emotion_codes[_int32_column(chapter_relations.attitude)]
+
+        counts = np.bincount(attitude, minlength=emotion_count)
+        codes, first = np.unique(attitude, return_index=True)
+        appearance = codes[np.argsort(first)].tolist()
+        row = self._chapter_rows.get(title)
+        if row is None:
+            self._chapter_rows[title] = len(self._chapter_counts)
+            self._chapter_counts.append(counts)
+            self._chapter_order.append(appearance)
+        else:
+            # 제목이 같은 챕터는 합친다
+            self._chapter_counts[row] = self._chapter_counts[row] + counts
+            known = set(self._chapter_order[row])
+            self._chapter_order[row].extend(code for code in appearance if code not in known)
+
+        src = self._char_codes[_int32_column(chapter_relations.src)]
+        dst = self._char_codes[_int32_column(chapter_relations.dst)]
+        pair_codes = (src * len(self.character_names) + dst) * emotion_count + attitude
+        codes, first, code_counts = np.unique(pair_codes, return_index=True, return_counts=True)
+        self._pending.append((codes, first + self.relations_count, code_counts))
+        if len(self._pending) >= self.MERGE_EVERY:
+            self._merge_pending()
+        self.relations_count += size
+        return {self.emotion_names[code]: int(counts[code]) for code in appearance}
+
+    def _merge_pending(self):
+        if not self._pending:
+            return
+        parts = [self._pair_totals] + self._pending
+        codes = np.concatenate([part[0] for part in parts])
+        first = np.concatenate([part[1] for part in parts])
+        counts = np.concatenate([part[2] for part in parts])
+        order = np.argsort(codes, kind="stable")
+        codes, first, counts = codes[order], first[order], counts[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        self._pair_totals = (codes[starts], np.minimum.reduceat(first, starts), np.add.reduceat(counts, starts))
+        self._pending = []
+
+    def emotion_matrix(self) -> Tuple[List[str], List[str], np.ndarray]:
+        """(챕터 제목, 감정어, 챕터×감정 개수 행렬) - 관계가 있는 챕터만, 본문 순서"""
+        titles = list(self._chapter_rows)
+        if self._chapter_counts:
+            matrix = np.vstack(self._chapter_counts)
+        else:
+            matrix = np.zeros((0, len(self.emotion_names)), dtype=np.int64)
+        return titles, list(self.emotion_names), matrix
+
+    def pair_emotion_entries(self) -> Tuple[List[Tuple[str, str]], List[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(인물 쌍, 감정어, 행, 열, 개수, 첫 등장 위치) - 쌍×감정 희소 행렬 (쌍은 첫 등장 순서)
+
+        행은 pairs의 인덱스, 열은 감정어 인덱스이며 한 번 이상 나온 (쌍, 감정)만 담는다.
+        """
+        self._merge_pending()
+        codes, first, counts = self._pair_totals
+        emotion_count = len(self.emotion_names)
+        character_count = len(self.character_names)
+        if not len(codes):
+            empty = np.zeros(0, dtype=np.int64)
+            return [], list(self.emotion_names), empty, empty, empty, empty
+        # 코드가 정렬되어 있으므로 같은 쌍은 연속한 구간을 이룬다
+        pair = codes // emotion_count
+        starts = np.flatnonzero(np.r_[True, pair[1:] != pair[:-1]])
+        by_appearance = np.argsort(np.minimum.reduceat(first, starts))
+        rank = np.empty(len(starts), dtype=np.int64)
+        rank[by_appearance] = np.arange(len(starts))
+        rows = rank[np.cumsum(np.r_[True, pair[1:] != pair[:-1]]) - 1]
+        names = self.character_names
+        pairs = [(names[code // character_count], names[code % character_count]) for code in pair[starts][by_appearance].tolist()]
+        return pairs, list(self.emotion_names), rows, codes % emotion_count, counts, first
+
+    def chapter_emotions(self) -> Dict[str, Dict[str, int]]:
+        """챕터마다 감정어별 개수 (감정어는 챕터 안에서 처음 나온 순서)"""
+        names = self.emotion_names
+        return {
+            title: {names[code]: int(self._chapter_counts[row][code]) for code in self._chapter_order[row]}
+            for title, row in self._chapter_rows.items()
+        }
+
+    def summary_relations(self) -> List[Dict]:
+        """인물 쌍마다 가장 많이 등장한 감정(동률이면 먼저 등장한 감정)으로 요약"""
+        pairs, names, rows, cols, counts, first = self.pair_emotion_entries()
+        if not pairs:
+            return []
+        # 쌍 순서, 개수 내림차순, 첫 등장 위치 순으로 정렬해 쌍마다 첫 항목을 대표로 (0이 아닌 항목 수에 비례)
+        order = np.lexsort((first, -counts, rows))
+        best = order[np.flatnonzero(np.r_[True, rows[order][1:] != rows[order][:-1]])]
+        return [
+            {"from": src, "to": tgt, "attitude": names[emo], "count": int(count)}
+            for (src, tgt), emo, count in zip(pairs, cols[best].tolist(), counts[best].tolist())
+        ]
+
+    def emotion_balance(self, emotion_lexicon: Dict[str, List[str]]) -> List[Dict]:
+        """챕터별 긍정/부정 감정 수와 차이(balance), 그 누적값 - 본문 순서의 감정 흐름"""
+        titles, names, matrix = self.emotion_matrix()
+        positive_words = set(emotion_lexicon.get("positive", []))
+        negative_words = set(emotion_lexicon.get("negative", []))
+        positive = matrix[:, [name in positive_words for name in names]].sum(axis=1)
+        negative = matrix[:, [name in negative_words for name in names]].sum(axis=1)
+        balance = positive - negative
+        cumulative = np.cumsum(balance)
+        return [
+            {"chapter": title, "positive": pos, "negative": neg, "balance": bal, "cumulative": cum}
+            for title, pos, neg, bal, cum in zip(titles, positive.tolist(), negative.tolist(),
+                                                  balance.tolist(), cumulative.tolist())
+        ]
+
+    def results(self, emotion_lexicon: Dict[str, List[str]]) -> Dict:
+        """결과 dict에 들어갈 집계 (챕터별 감정, 요약 관계, 챕터×감정 행렬, 긍정/부정 흐름)"""
+        titles, names, matrix = self.emotion_matrix()
+        # 어느 챕터에도 나오지 않은 감정어 열은 빼고 보낸다 (사전이 커도 결과 크기는 실제 등장한 감정어 수에 비례)
+        used = np.flatnonzero(matrix.any(axis=0))
+        return {
+            "chapter_emotions": self.chapter_emotions(),
+            "summary_relations": self.summary_relations(),
+            "chapter_emotion_matrix": {"chapters": titles, "emotions": [names[i] for i in used.tolist()],
+                                       "counts": matrix[:, used].tolist()},
+            "emotion_balance": self.emotion_balance(emotion_lexicon)
+        }
+
+def _lexicon_emotions(emotion_lexicon: Dict[str, List[str]]) -> List[str]:
     emotions = emotion_lexicon.get("positive", []) + emotion_lexicon.get("negative", [])
     if not emotions:
         logger.warning("감정어 사전이 비어있습니다.")
+    return emotions
+
+def _iter_chapter_results(
+    chapters: Iterable[ChapterView],
+    chapter_count: int,
+    total_size: int,
+    characters: List[str],
+    emotions: List[str],
+    progress_callback,
+    matcher: str,
+    workers: int,
+    chunk_size: int,
+    cache: Optional[ChapterCache],
+    profiler: Optional[StageProfiler],
+    window: int,
+    chapter_size: Callable[[ChapterView], int] = _view_chars
+) -> Generator[Tuple[str, RelationStore], None, None]:
+    """챕터 흐름을 분석해 챕터 순서대로 (제목, 관계 저장소)를 생성"""
+    _check_window(window, matcher)
+    # 진행 상황 추적 초기화
+    tracker = ProgressTracker(chapter_count, total_size, profiler)
     
-    all_relations = []
-    chapter_emotions = defaultdict(lambda: defaultdict(int))
-    relation_map = defaultdict(list)  # (from, to) -> list of attitudes
+    def report_progress(title, chapter_relations, size):
+        # 진행 상황 업데이트 및 콜백 (챕터가 끝나는 즉시)
+        progress_info = tracker.update(title, chapter_relations, size)
+        if progress_callback:
+            progress_callback(progress_info)
     
+    if profiler is not None:
+        # 파일 입력은 챕터를 꺼낼 때 읽고 나누므로 그 시간을 챕터 분할로 센다
+        chapters = profiler.timed(chapters, "chapter_split")
     try:
-        # 챕터별 스트리밍 처리
-        for title, content in split_into_chapters_stream(text, chapter_pattern):
-            logger.info(f"챕터 처리 시작: {title} ({len(content) / 1024:.1f}KB)")
-            
-            # 대용량 챕터는 청크 단위로 처리
-            chapter_relations = []
-            for chunk in chunk_text(content):
-                chunk_relations = extract_relations(chunk, characters, emotions, title)
-                chapter_relations.extend(chunk_relations)
-            
-            # 챕터 단위 처리 결과 통합
-            all_relations.extend(chapter_relations)
-            for r in chapter_relations:
-                chapter_emotions[title][r["attitude"]] += 1
-                relation_map[(r["from"], r["to"])].append(r["attitude"])
-            
-            # 진행 상황 업데이트 및 콜백
-            progress_info = tracker.update(title, chapter_relations)
-            if progress_callback:
-                progress_callback(progress_info)
-    
+        # 챕터별 스트리밍 처리 (대용량 챕터는 청크 단위로 처리)
+        if cache is not None:
+            yield from _analyze_chapters_cached(chapters, cache, characters, emotions, matcher, workers, chunk_size,
+                                                report_progress, profiler, window, chapter_size)
+        else:
+            yield from _analyze_chapters(chapters, characters, emotions, matcher, workers, chunk_size,
+                                         report_progress, profiler, window, chapter_size)
     except Exception as e:
         logger.error(f"텍스트 분석 중 오류 발생: {str(e)}")
         raise
+
+def _log_completion(relations_count: int, summary_count: int):
+    logger.info(f"분석 완료: 관계 {relations_count}개, 요약 관계 {summary_count}개")
+    cache_info = matcher_cache_info()
+    logger.info(f"매처 캐시: 적중 {cache_info['hits']}회, 실패 {cache_info['misses']}회, 크기 {cache_info['size']}/{cache_info['maxsize']}")
+
+def _encoded_size(text: str, encoding: str) -> int:
+    """text를 encoding으로 저장했을 때의 바이트 수 (ASCII만 있으면 인코딩하지 않는다)"""
+    return len(text) if text.isascii() else len(text.encode(encoding, errors="replace"))
+
+def _file_chapters(path: str, chapter_pattern: str, encoding: Optional[str], characters: List[str],
+                   profiler: Optional[StageProfiler] = None) -> Tuple[Iterable[ChapterView], None, int, Callable[[ChapterView], int]]:
+    """파일에서 읽은 챕터 흐름, 챕터 수(읽기 전에는 모름), 파일 크기(바이트), 챕터 크기(바이트) 함수
+
+    파일을 한 번만 읽도록 챕터 수를 미리 세지 않고, 진행률은 파일 크기에 대한 챕터 바이트 수로 계산한다.
+    """
+    file_size = os.path.getsize(path)
+    logger.info(f"파일 분석 시작: {path} ({file_size / (1024 * 1024):.2f}MB), 등장인물 {len(characters)}명")
+    if encoding is None:
+        with _stage(profiler, "chapter_split"):
+            encoding = detect_file_encoding(path)
+    chapters = ((title, content, 0, len(content)) for title, content in iter_file_chapters(path, chapter_pattern, encoding))
+    return chapters, None, file_size, lambda chapter: _encoded_size(chapter[1], encoding)
+
+def _text_chapters(text: str, chapter_pattern: str, characters: List[str],
+                   profiler: Optional[StageProfiler] = None) -> Tuple[Iterable[ChapterView], int, int]:
+    """문자열에서 만든 챕터 뷰 흐름과 챕터 수, 전체 챕터 크기(문자 수)"""
+    # 전체 텍스트 길이 로깅
+    text_mb = len(text) / (1024 * 1024)
+    logger.info(f"텍스트 분석 시작: {text_mb:.2f}MB, 등장인물 {len(characters)}명")
+    
+    # 한 번의 스캔으로 챕터 오프셋 표를 만들고, 진행률 계산과 챕터 순회에 함께 사용
+    with _stage(profiler, "chapter_split"):
+        chapter_index = ChapterIndex(text, chapter_pattern)
+    total_size = sum(end - start for _, start, end in chapter_index.entries)
+    return chapter_index.views(), len(chapter_index), total_size
+
+# === 스트리밍 분석 API ===
+def iter_analysis(
+    text: str,
+    characters: List[str],
+    emotion_lexicon: Dict[str, List[str]],
+    chapter_pattern: str = r"(Letter \d+|Chapter \d+)",
+    progress_callback=None,
+    matcher: str = DEFAULT_MATCHER,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    cache: Optional[ChapterCache] = None,
+    profiler: Optional[StageProfiler] = None,
+    window: int = 1
+) -> Generator[Dict, None, None]:
+    """챕터 분석이 끝날 때마다 결과를 이벤트로 생성하는 스트리밍 분석
+
+    이벤트 순서: {"type": "start"} -> 챕터마다 {"type": "chapter"} -> {"type": "summary"}.
+    관계 목록은 챕터 이벤트에만 담기므로 전체 결과를 메모리에 모아 두지 않는다.
+    """
+    chapters, chapter_count, total_size = _text_chapters(text, chapter_pattern, characters, profiler)
+    yield from _iter_events(chapters, chapter_count, total_size, characters, emotion_lexicon,
+                            progress_callback, matcher, workers, chunk_size, cache, profiler, window)
+
+def iter_analysis_file(
+    path: str,
+    characters: List[str],
+    emotion_lexicon: Dict[str, List[str]],
+    chapter_pattern: str = r"(Letter \d+|Chapter \d+)",
+    progress_callback=None,
+    matcher: str = DEFAULT_MATCHER,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    encoding: Optional[str] = None,
+    cache: Optional[ChapterCache] = None,
+    profiler: Optional[StageProfiler] = None,
+    window: int = 1
+) -> Generator[Dict, None, None]:
+    """iter_analysis의 파일 입력 버전 (파일을 챕터 단위로 읽으며 분석)
+
+    파일은 한 번만 읽으므로 start 이벤트의 chapters는 None이고 size는 파일 크기(바이트)다.
+    """
+    chapters, chapter_count, total_size, chapter_size = _file_chapters(path, chapter_pattern, encoding, characters, profiler)
+    yield from _iter_events(chapters, chapter_count, total_size, characters, emotion_lexicon,
+                            progress_callback, matcher, workers, chunk_size, cache, profiler, window, chapter_size)
+
+def _iter_events(
+    chapters: Iterable[ChapterView],
+    chapter_count: int,
+    total_size: int,
+    characters: List[str],
+    emotion_lexicon: Dict[str, List[str]],
+    progress_callback,
+    matcher: str,
+    workers: int,
+    chunk_size: int,
+    cache: Optional[ChapterCache],
+    profiler: Optional[StageProfiler],
+    window: int,
+    chapter_size: Callable[[ChapterView], int] = _view_chars
+) -> Generator[Dict, None, None]:
+    emotions = _lexicon_emotions(emotion_lexicon)
+    aggregator = RelationAggregator(characters, emotions)
+    yield {"type": "start", "chapters": chapter_count, "size": total_size}
+    
+    for title, chapter_relations in _iter_chapter_results(chapters, chapter_count, total_size, characters, emotions,
+                                                          progress_callback, matcher, workers, chunk_size, cache, profiler, window,
+                                                          chapter_size):
+        with _stage(profiler, "aggregation"):
+            chapter_counts = aggregator.add(title, chapter_relations)
+        with _stage(profiler, "serialization"):
+            relations = chapter_relations.to_dicts()
+        yield {
+            "type": "chapter",
+            "chapter": title,
+            "relations": relations,
+            "emotions": chapter_counts
+        }
+    
+    with _stage(profiler, "aggregation"):
+        aggregates = aggregator.results(emotion_lexicon)
+    _log_completion(aggregator.relations_count, len(aggregates["summary_relations"]))
+    yield {"type": "summary", **aggregates}
+
+def write_ndjson(events: Iterable[Dict], fp) -> int:
+    """이벤트를 한 줄에 하나씩 JSON으로 기록 (NDJSON), 기록한 줄 수를 반환
+
+    fp는 텍스트 모드 파일 객체 (파일, sys.stdout, HTTP 응답 스트림 등).
+    """
+    lines = 0
+    for event in events:
+        fp.write(json.dumps(event, ensure_ascii=False))
+        fp.write("\n")
+        lines += 1
+    fp.flush()
+    return lines
+
+# === 핵심 분석 함수 (최적화) ===
+def run_analysis(
+    text: str,
+    characters: List[str],
+    emotion_lexicon: Dict[str, List[str]],
+    chapter_pattern: str = r"(Letter \d+|Chapter \d+)",
+    progress_callback=None,
+    matcher: str = DEFAULT_MATCHER,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    compact: bool = False,
+    cache: Optional[ChapterCache] = None,
+    profiler: Optional[StageProfiler] = None,
+    window: int = 1
+) -> Dict:
+    """대용량 텍스트를 처리하도록 최적화된 분석 함수
+
+    workers가 2 이상이면 챕터(묶음)를 프로세스 풀에서 병렬로 분석한다.
+    결과는 챕터 순서대로 병합되므로 직렬 모드와 동일하다.
+    청크 경계는 문장 경계에 맞춰지므로 chunk_size를 바꿔도 결과는 같다.
+    compact=True이면 "relations"로 dict 목록 대신 RelationStore를 돌려준다.
+    cache(ChapterCache)를 주면 내용이 바뀌지 않은 챕터는 디스크 캐시의 결과를 재사용한다.
+    profiler(StageProfiler)를 주면 단계별 시간을 재고 진행 상황 콜백에 "stages"로 함께 넘긴다.
+    window가 2 이상이면 연속한 window개 문장 안에 함께 나온 인물·감정어로 관계를 찾는다
+    (이웃 문장에 나뉜 대화도 잡는다, SentenceWindow 참조).
+    """
+    chapters, chapter_count, total_size = _text_chapters(text, chapter_pattern, characters, profiler)
+    return _run_chapters(chapters, chapter_count, total_size, characters, emotion_lexicon,
+                         progress_callback, matcher, workers, chunk_size, compact, cache, profiler, window)
+
+def run_analysis_file(
+    path: str,
+    characters: List[str],
+    emotion_lexicon: Dict[str, List[str]],
+    chapter_pattern: str = r"(Letter \d+|Chapter \d+)",
+    progress_callback=None,
+    matcher: str = DEFAULT_MATCHER,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    encoding: Optional[str] = None,
+    compact: bool = False,
+    cache: Optional[ChapterCache] = None,
+    profiler: Optional[StageProfiler] = None,
+    window: int = 1
+) -> Dict:
+    """텍스트 파일을 메모리 맵과 점진적 디코딩으로 읽으며 분석 (run_analysis와 같은 결과)
+
+    파일 전체를 문자열로 만들지 않고 챕터를 찾는 대로 분석하므로
+    최대 메모리 사용량은 챕터 하나 정도에 머문다.
+    """
+    chapters, chapter_count, total_size, chapter_size = _file_chapters(path, chapter_pattern, encoding, characters, profiler)
+    return _run_chapters(chapters, chapter_count, total_size, characters, emotion_lexicon,
+                         progress_callback, matcher, workers, chunk_size, compact, cache, profiler, window, chapter_size)
+
+def _run_chapters(
+    chapters: Iterable[ChapterView],
+    chapter_count: int,
+    total_size: int,
+    characters: List[str],
+    emotion_lexicon: Dict[str, List[str]],
+    progress_callback,
+    matcher: str,
+    workers: int,
+    chunk_size: int,
+    compact: bool,
+    cache: Optional[ChapterCache],
+    profiler: Optional[StageProfiler],
+    window: int,
+    chapter_size: Callable[[ChapterView], int] = _view_chars
+) -> Dict:
+    """챕터 흐름을 분석하고 결과를 통합"""
+    emotions = _lexicon_emotions(emotion_lexicon)
+    all_relations = RelationStore(characters, emotions)
+    aggregator = RelationAggregator(characters, emotions)
+    
+    for title, chapter_relations in _iter_chapter_results(chapters, chapter_count, total_size, characters, emotions,
+                                                          progress_callback, matcher, workers, chunk_size, cache, profiler, window,
+                                                          chapter_size):
+        # 챕터 단위 처리 결과 통합
+        with _stage(profiler, "aggregation"):
+            all_relations.extend(chapter_relations)
+            aggregator.add(title, chapter_relations)
     
     # 대표 감정 계산
     logger.info("관계 요약 생성 중...")
-    summarized_relations = []
-    for (src, tgt), att_list in relation_map.items():
-        counter = Counter(att_list)
-        if counter:  # 비어있지 않은 경우만
-            representative = counter.most_common(1)[0][0]  # 가장 많이 등장한 감정
-            summarized_relations.append({
-                "from": src,
-                "to": tgt,
-                "attitude": representative,
-                "count": counter[representative]
-            })
-    
-    logger.info(f"분석 완료: 관계 {len(all_relations)}개, 요약 관계 {len(summarized_relations)}개")
+    with _stage(profiler, "aggregation"):
+        aggregates = aggregator.results(emotion_lexicon)
+    _log_completion(len(all_relations), len(aggregates["summary_relations"]))
     
+    with _stage(profiler, "serialization"):
+        relations = all_relations if compact else all_relations.to_dicts()
     return {
-        "relations": all_relations,
-        "chapter_emotions": dict(chapter_emotions),  # defaultdict를 일반 dict로 변환
-        "summary_relations": summarized_relations
+        "relations": relations,
+        **aggregates
     }
 
+# === 문서 색인 (같은 책 반복 분석용) ===
+DOCUMENT_INDEX_VERSION = 1
+_TOKEN = re.compile(r'\w+')
+
+def _token_stems(token: str) -> Tuple[str, ...]:
+    """색인에 넣을 형태: 토큰 자신과 끝의 조사(최대 두 개)를 뗀 형태들"""
+    stems = {token}
+    frontier = [token]
+    for _ in range(2):
+        next_frontier = []
+        for form in frontier:
+            if not _is_hangul(form[-1]):
+                continue
+            for particle in KOREAN_PARTICLES:
+                if len(form) > len(particle) and form.endswith(particle):
+                    next_frontier.append(form[:-len(particle)])
+        stems.update(next_frontier)
+        frontier = next_frontier
+    return tuple(stems)
+
+class DocumentIndex:
+    """한 문서의 챕터/문장 오프셋과 토큰 -> 문장 ID 역색인
+
+    한 번 만들어 저장해 두면 인물 목록이나 감정어 사전을 바꿔 다시 분석할 때
+    문장을 다시 나누거나 전체 텍스트를 스캔하지 않고, 사전 단어의 토큰이 들어 있는
+    후보 문장만 매처로 확인한다. 토큰은 소문자로 색인하고, 한국어 조사가 붙은
+    토큰(빅터는, 사랑을)은 조사를 뗀 형태로도 색인한다.
+    """
+
+    def __init__(self, text: str, chapter_pattern: str, chapters: List[Tuple[str, int, int]],
+                 sentence_starts: array, sentence_ends: array, chapter_sentences: array,
+                 postings: Dict[str, array]):
+        self.text = text
+        self.chapter_pattern = chapter_pattern
+        self.chapters = chapters  # (제목, 시작, 끝)
+        self.sentence_starts = sentence_starts
+        self.sentence_ends = sentence_ends
+        self.chapter_sentences = chapter_sentences  # 챕터 i의 문장 ID 범위: [i], [i + 1]
+        self.postings = postings
+        self.text_hash = hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+    @classmethod
+    def build(cls, text: str, chapter_pattern: str = r"(Letter \d+|Chapter \d+)") -> "DocumentIndex":
+        """챕터/문장 분할과 역색인 생성 (run_analysis와 같은 챕터·문장 경계)"""
+        chapters = ChapterIndex(text, chapter_pattern).entries
+        sentence_starts, sentence_ends = array('q'), array('q')
+        chapter_sentences = array('q', [0])
+        postings = {}
+        stems_of = {}
+        for _, start, end in chapters:
+            for sent_start, sent_end in split_sentence_spans(text, start, end):
+                sentence_id = len(sentence_starts)
+                sentence_starts.append(sent_start)
+                sentence_ends.append(sent_end)
+                forms = set()
+                for token in set(_TOKEN.findall(text, sent_start, sent_end)):
+                    stems = stems_of.get(token)
+                    if stems is None:
+                        stems = stems_of[token] = _token_stems(token.lower())
+                    forms.update(stems)
+                for form in forms:
+                    posting = postings.get(form)
+                    if posting is None:
+                        posting = postings[form] = array('i')
+                    posting.append(sentence_id)
+            chapter_sentences.append(len(sentence_starts))
+        logger.info(f"문서 색인 생성: 챕터 {len(chapters)}개, 문장 {len(sentence_starts)}개, 색인어 {len(postings)}개")
+        return cls(text, chapter_pattern, chapters, sentence_starts, sentence_ends, chapter_sentences, postings)
+
+    def save(self, path: str):
+        state = {
+            "version": DOCUMENT_INDEX_VERSION,
+            "text": self.text,
+            "chapter_pattern": self.chapter_pattern,
+            "chapters": self.chapters,
+            "sentence_starts": self.sentence_starts,
+            "sentence_ends": self.sentence_ends,
+            "chapter_sentences": self.chapter_sentences,
+            "postings": self.postings
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "DocumentIndex":
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != DOCUMENT_INDEX_VERSION:
+            raise ValueError(f"지원하지 않는 색인 버전입니다: {state.get('version')} ({path})")
+        del state["version"]
+        return cls(**state)
+
+    @classmethod
+    def load_or_build(cls, path: str, text: str, chapter_pattern: str = r"(Letter \d+|Chapter \d+)") -> "DocumentIndex":
+        """저장된 색인이 같은 텍스트·챕터 패턴으로 만들어졌으면 불러오고, 아니면 새로 만들어 저장"""
+        try:
+            index = cls.load(path)
+            text_hash = hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+            if index.text_hash == text_hash and index.chapter_pattern == chapter_pattern:
+                return index
+            logger.info(f"문서가 바뀌어 색인을 다시 만듭니다: {path}")
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError) as e:
+            logger.info(f"저장된 색인을 쓸 수 없어 새로 만듭니다: {path} ({e})")
+        index = cls.build(text, chapter_pattern)
+        index.save(path)
+        return index
+
+    def candidate_sentences(self, words: List[str]) -> Optional[Set[int]]:
+        """단어 중 하나라도 들어 있을 수 있는 문장 ID (토큰이 없는 단어가 있으면 None = 전체)"""
+        candidates = set()
+        for word in words:
+            word_sentences = self._word_sentences(word)
+            if word_sentences is None:
+                return None
+            candidates |= word_sentences
+        return candidates
+
+    def _word_sentences(self, word: str) -> Optional[Set[int]]:
+        tokens = _TOKEN.findall(word.lower())
+        if not tokens:
+            return None
+        sentences = None
+        for token in tokens:
+            posting = self.postings.get(token, ())
+            sentences = set(posting) if sentences is None else sentences.intersection(posting)
+            if not sentences:
+                break
+        return sentences
+
+    def _relation_candidates(self, characters: List[str], emotions: List[str]) -> List[int]:
+        """인물이 둘 이상, 감정어가 하나 이상 들어 있을 수 있는 문장 ID (오름차순)"""
+        all_sentences = range(len(self.sentence_starts))
+        emotion_sentences = self.candidate_sentences(emotions)
+        character_counts = Counter()
+        for char in characters:
+            char_sentences = self._word_sentences(char)
+            character_counts.update(all_sentences if char_sentences is None else char_sentences)
+        return sorted(s for s, count in character_counts.items()
+                      if count >= 2 and (emotion_sentences is None or s in emotion_sentences))
+
+    def analyze(
+        self,
+        characters: List[str],
+        emotion_lexicon: Dict[str, List[str]],
+        progress_callback=None,
+        compact: bool = False,
+        particles: bool = True
+    ) -> Dict:
+        """색인의 후보 문장만 확인해 run_analysis와 같은 형식의 결과를 반환
+
+        particles=False이면 run_analysis(matcher="combined")와 결과가 같다.
+        particles=True이면 조사가 붙은 이름/감정어도 일치로 센다.
+        """
+        emotions = _lexicon_emotions(emotion_lexicon)
+        compiled = get_compiled_lexicon(characters, emotions, particles)
+        candidates = self._relation_candidates(characters, emotions)
+        logger.info(f"색인 분석: 후보 문장 {len(candidates)}/{len(self.sentence_starts)}개, 등장인물 {len(characters)}명")
+
+        text = self.text
+        all_relations = RelationStore(characters, emotions)
+        aggregator = RelationAggregator(characters, emotions)
+        tracker = ProgressTracker(len(self.chapters), sum(end - start for _, start, end in self.chapters))
+        cursor = 0
+        for chapter_idx, (title, start, end) in enumerate(self.chapters):
+            chapter_relations = RelationStore(characters, emotions)
+            chapter_id = chapter_relations.add_chapter(title)
+            chapter_end = self.chapter_sentences[chapter_idx + 1]
+            while cursor < len(candidates) and candidates[cursor] < chapter_end:
+                span = (self.sentence_starts[candidates[cursor]], self.sentence_ends[candidates[cursor]])
+                cursor += 1
+                for sent, present, emotion_ids in _sentence_hits(compiled, text, [span]):
+                    chapter_relations.add_sentence(chapter_id, sent, present, emotion_ids)
+            all_relations.extend(chapter_relations)
+            aggregator.add(title, chapter_relations)
+            progress_info = tracker.update(title, chapter_relations, end - start)
+            if progress_callback:
+                progress_callback(progress_info)
+
+        aggregates = aggregator.results(emotion_lexicon)
+        _log_completion(len(all_relations), len(aggregates["summary_relations"]))
+        return {
+            "relations": all_relations if compact else all_relations.to_dicts(),
+            **aggregates
+        }
+
 # === 테스트 실행용 ===
 if __name__ == "__main__":
-    with open("sample_text.txt", "r", encoding="utf-8") as f:
-        sample = f.read()
     with open("characters.txt", "r", encoding="utf-8") as f:
         char_list = [line.strip() for line in f if line.strip()]
     with open("attitude_lexicon.json", "r", encoding="utf-8") as f:
         emo_dict = json.load(f)
 
     def progress_printer(info):
-        print(f"진행률: {info['progress']:.1f}% - {info['chapter']} 처리 완료")
+        print(f"진행률: {info['progress']:.1f}% - {info['chapter']} 처리 완료 ({info['mb_per_s']:.2f}MB/s, 남은 시간 {info['eta_seconds']:.0f}초)")
 
-    result = run_analysis(sample, char_list, emo_dict, progress_callback=progress_printer)
+    result = run_analysis_file("sample_text.txt", char_list, emo_dict, progress_callback=progress_printer)
     print(json.dumps(result, indent=2, ensure_ascii=False))
\ No newline at end of file
@@ -1,258 +1,592 @@
 import gradio as gr
 import requests
+import httpx
+import asyncio
 import json
-import pandas as pd
 import io
+import pandas as pd
 import networkx as nx
-import matplotlib.pyplot as plt
+import matplotlib
+from matplotlib.figure import Figure
 import time
-from threading import Thread, Event
+import math
 import os
 import tempfile
+import gzip
+import codecs
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from core_analysis import detect_encoding, detect_file_encoding, _encoding_probe, _iter_file_blocks, read_text_file
+
+# SVG의 글자를 경로 대신 텍스트로 남겨 파일을 줄이고 브라우저 글꼴로 한글을 표시
+matplotlib.rcParams["svg.fonttype"] = "none"
 
 API_URL = "http://localhost:8000/analyze"
 TASKS_URL = "http://localhost:8000/tasks/"
 RESULTS_URL = "http://localhost:8000/results/"
+TEXTS_URL = "http://localhost:8000/texts/"
 
-# 작업 상태 폴링 간격(초)
-POLLING_INTERVAL = 1.0
+# 진행 상황 이벤트 스트림 읽기 제한 시간(초) - 서버가 15초마다 연결 유지 신호를 보낸다
+EVENTS_READ_TIMEOUT = 60
+# 본문 업로드: 청크 하나의 크기(압축 전 바이트), 청크 요청 제한 시간(초), 연결 오류 시 재시도 횟수
+UPLOAD_CHUNK_BYTES = 4 * 1024 * 1024
+UPLOAD_TIMEOUT = 60
+UPLOAD_RETRIES = 3
+# 관계 표 한 페이지의 행 수 (서버에서 한 페이지씩만 받아 온다)
+RELATIONS_PAGE_SIZE = 50
+RELATION_COLUMNS = ["from", "to", "attitude", "sentence", "chapter"]
+RELATION_SORT_CHOICES = [("본문 순서", "order"), ("보낸 인물", "from"), ("받는 인물", "to"), ("감정", "attitude"), ("챕터", "chapter")]
+# CSV·결과 파일 등 UI가 만드는 파일: 내용 해시로 이름을 붙이고 최근 파일만 남긴다
+UI_OUTPUT_DIR = os.path.join(tempfile.gettempdir(), "literature_analysis_ui")
+UI_OUTPUT_MAX_FILES = 64
+# 관계 그래프: 렌더링 스레드 수, 레이아웃/렌더링 캐시 크기, 그림 최대 한 변(인치),
+# 엣지 레이블과 화살표를 그리는 최대 엣지 수 (넘으면 선 굵기로만 표시)
+GRAPH_RENDER_WORKERS = 2
+GRAPH_CACHE_SIZE = 32
+GRAPH_MAX_INCHES = 40
+GRAPH_LABEL_EDGE_LIMIT = 200
+GRAPH_RENDER_TIMEOUT = 300
 
 def upload_file_to_text(file_obj):
-    """업로드된 파일을 텍스트로 변환"""
+    """업로드된 파일을 텍스트로 변환 (앞부분으로 인코딩을 판별한 뒤 한 번만 디코딩)"""
     try:
-        # 다양한 인코딩 시도
-        encodings = ['utf-8', 'utf-8-sig', 'euc-kr', 'cp949', 'latin-1']
-        content = None
-        
-        for enc in encodings:
-            try:
-                content = file_obj.decode(enc)
-                break
-            except UnicodeDecodeError:
-                continue
-        
-        if content is None:
-            return "파일 인코딩을 인식할 수 없습니다. UTF-8, EUC-KR, CP949 중 하나를 사용해 주세요.", None
+        if isinstance(file_obj, bytes):
+            # 파일과 같은 기준: 앞부분(또는 첫 비ASCII 구간)만으로 판별하고 전체는 한 번만 디코딩
+            encoding = detect_encoding(*_encoding_probe(file_obj))
+            if encoding is None:
+                raise UnicodeError("파일 인코딩을 인식할 수 없습니다. UTF-8, EUC-KR, CP949 중 하나를 사용해 주세요.")
+            content = file_obj.decode(encoding)
+        else:
+            # gr.File은 업로드된 임시 파일 경로(또는 name 속성을 가진 객체)를 넘긴다
+            path = file_obj if isinstance(file_obj, str) else file_obj.name
+            content, encoding = read_text_file(path)
         
         file_size_mb = len(content) / (1024 * 1024)
-        return f"파일을 성공적으로 불러왔습니다. (크기: {file_size_mb:.2f}MB)", content
+        return f"파일을 성공적으로 불러왔습니다. (크기: {file_size_mb:.2f}MB, 인코딩: {encoding})", content
+    except UnicodeError as e:
+        return str(e), None
     except Exception as e:
         return f"파일 처리 중 오류가 발생했습니다: {str(e)}", None
 
-def poll_task_status(task_id, progress_bar, status_text, result_ready=None):
-    """작업 상태를 주기적으로 확인하는 함수"""
-    while True:
+def save_output_file(chunks, prefix, suffix):
+    """바이트 청크들을 내용 해시 이름의 파일로 저장하고 경로 반환
+
+    같은 내용은 같은 파일이 되어 동시 요청끼리 이름이 겹치지 않고, 오래된 파일은
+    UI_OUTPUT_MAX_FILES개만 남기고 지운다.
+    """
+    os.makedirs(UI_OUTPUT_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=UI_OUTPUT_DIR, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        for chunk in chunks:
+            digest.update(chunk)
+            f.write(chunk)
+    path = os.path.join(UI_OUTPUT_DIR, f"{prefix}_{digest.hexdigest()[:16]}{suffix}")
+    os.replace(tmp_path, path)
+    os.utime(path)  # 같은 내용을 다시 만든 경우에도 최근 파일로 표시
+    
+    files = sorted((entry for entry in os.scandir(UI_OUTPUT_DIR) if entry.is_file()),
+                   key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in files[UI_OUTPUT_MAX_FILES:]:
         try:
-            response = requests.get(f"{TASKS_URL}{task_id}")
-            if response.status_code == 200:
-                data = response.json()
-                status = data.get("status")
-                progress = data.get("progress", 0)
-                message = data.get("message", "진행 중...")
-                
-                # UI 업데이트
-                progress_bar.update(value=progress)
-                status_text.update(value=f"상태: {status} - {message}")
-                
-                # 작업 완료 또는 실패 시 폴링 종료
-                if status in ["completed", "failed"]:
-                    if result_ready is not None:
-                        result_ready.set()
-                    break
-                    
-            else:
-                status_text.update(value=f"상태 확인 실패: {response.status_code}")
-                time.sleep(5)  # 오류 시 더 긴 대기 시간
-                
-        except Exception as e:
-            status_text.update(value=f"통신 오류: {str(e)}")
-            time.sleep(5)
-            
-        time.sleep(POLLING_INTERVAL)
+            os.remove(entry.path)
+        except OSError:
+            pass
+    return path
+
+def _text_state(text_hash):
+    response = requests.get(f"{TEXTS_URL}{text_hash}", timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+# === 업로드할 본문 (UTF-8 바이트를 블록 단위로 읽는 read_from(offset) 함수) ===
+def _bytes_source(data):
+    """메모리에 있는 UTF-8 바이트를 청크 크기로 나눠 읽는 read_from"""
+    def read_from(offset):
+        for start in range(offset, len(data), UPLOAD_CHUNK_BYTES):
+            yield data[start:start + UPLOAD_CHUNK_BYTES]
+    return read_from
+
+def _file_source(path, encoding):
+    """파일을 UTF-8 바이트 블록으로 읽는 read_from
+
+    UTF-8 파일은 그대로 읽고, 다른 인코딩은 블록 단위로 UTF-8로 바꾼다.
+    어느 쪽이든 본문 전체를 문자열이나 바이트로 만들지 않는다.
+    """
+    def read_from(offset):
+        if encoding == "utf-8":
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while block := f.read(UPLOAD_CHUNK_BYTES):
+                    yield block
+            return
+        skip = offset
+        for text in _iter_file_blocks(path, encoding, UPLOAD_CHUNK_BYTES):
+            block = text.encode("utf-8")
+            if skip >= len(block):
+                skip -= len(block)
+                continue
+            yield block[skip:]
+            skip = 0
+    return read_from
+
+def _text_source(text):
+    """문자열 본문의 (read_from, 바이트 수, SHA-256)"""
+    data = text.encode("utf-8")
+    return _bytes_source(data), len(data), hashlib.sha256(data).hexdigest()
+
+def _path_source(path):
+    """파일 본문의 (read_from, UTF-8 바이트 수, SHA-256) - 블록 단위로 한 번 읽어 해시만 계산"""
+    encoding = detect_file_encoding(path)
+    read_from = _file_source(path, encoding)
+    # 앞부분으로 판별한 UTF-8 파일도 뒤에 깨진 바이트가 있으면 여기서 UnicodeDecodeError
+    validator = codecs.getincrementaldecoder("utf-8")() if encoding == "utf-8" else None
+    digest = hashlib.sha256()
+    size = 0
+    for block in read_from(0):
+        if validator is not None:
+            validator.decode(block)
+        digest.update(block)
+        size += len(block)
+    if validator is not None:
+        validator.decode(b"", final=True)
+    return read_from, size, digest.hexdigest()
+
+def _rechunk(blocks, chunk_size):
+    """크기가 제각각인 블록을 chunk_size 바이트 청크로 다시 나눔"""
+    buf = bytearray()
+    for block in blocks:
+        buf += block
+        while len(buf) >= chunk_size:
+            yield bytes(buf[:chunk_size])
+            del buf[:chunk_size]
+    if buf:
+        yield bytes(buf)
+
+def upload_text(read_from, size, text_hash):
+    """본문(UTF-8 바이트)을 gzip 청크로 서버에 올리며 (보낸 바이트, 전체 바이트)를 차례로 생성
 
-def analyze_text(text, characters_str, emotion_lex_json, chapter_pattern, progress_bar, status_text, progress_container):
-    """텍스트 분석 실행하고 결과 반환"""
+    read_from(offset)은 offset 바이트부터의 본문을 블록 단위로 돌려주므로 본문 전체를
+    메모리에 둘 필요가 없다. 서버에 같은 해시의 본문이 이미 있으면 아무것도 보내지 않는다.
+    연결이 끊기면 서버가 실제로 받은 위치를 다시 조회해 거기서부터 이어서 보낸다.
+    """
+    state = _text_state(text_hash)
+    if state["complete"]:
+        return
+    received = state["received"]
+    chunks = _rechunk(read_from(received), UPLOAD_CHUNK_BYTES)
+    failures = 0
+    while received < size:
+        raw = next(chunks)
+        chunk = gzip.compress(raw, compresslevel=6)
+        try:
+            response = requests.put(
+                f"{TEXTS_URL}{text_hash}/chunks",
+                params={"offset": received},
+                data=chunk,
+                headers={"Content-Type": "application/octet-stream", "Content-Encoding": "gzip"},
+                timeout=UPLOAD_TIMEOUT
+            )
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            failures += 1
+            if failures > UPLOAD_RETRIES:
+                raise
+            time.sleep(failures)
+            received = _text_state(text_hash)["received"]
+            chunks = _rechunk(read_from(received), UPLOAD_CHUNK_BYTES)
+            continue
+        if response.status_code == 409:
+            # 서버가 받은 위치와 어긋남 (다른 탭에서 같은 본문을 올리는 중 등)
+            received = _text_state(text_hash)["received"]
+            chunks = _rechunk(read_from(received), UPLOAD_CHUNK_BYTES)
+            continue
+        response.raise_for_status()
+        expected = received + len(raw)
+        received = response.json()["received"]
+        if received != expected:
+            chunks = _rechunk(read_from(received), UPLOAD_CHUNK_BYTES)
+        failures = 0
+        yield received, size
+    response = requests.post(f"{TEXTS_URL}{text_hash}/complete", timeout=UPLOAD_TIMEOUT)
+    response.raise_for_status()
+
+async def stream_task_events(task_id):
+    """작업 진행 상황을 서버 전송 이벤트(SSE)로 구독해 상태 dict를 차례로 생성
+
+    비동기 클라이언트로 읽으므로 다음 이벤트를 기다리는 동안 작업자 스레드를 붙잡지 않는다.
+    """
+    timeout = httpx.Timeout(EVENTS_READ_TIMEOUT, connect=10)
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        async with client.stream("GET", f"{TASKS_URL}{task_id}/events") as response:
+            response.raise_for_status()
+            data_lines = []
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    data_lines.append(line[5:].strip())
+                elif line == "" and data_lines:
+                    # 빈 줄이 이벤트 하나의 끝
+                    yield json.loads("\n".join(data_lines))
+                    data_lines = []
+
+def _relation_filters(source=None, target=None, attitude=None, chapter=None, sort="order", descending=False):
+    """관계 조회 요청 파라미터 (비어 있는 필터는 보내지 않는다)"""
+    filters = {"from": source, "to": target, "attitude": attitude, "chapter": chapter}
+    params = {key: value for key, value in filters.items() if value}
+    params.update(sort=sort or "order", order="desc" if descending else "asc")
+    return params
+
+def fetch_result_summary(task_id):
+    """관계 목록을 뺀 결과 요약 (그래프, 챕터별 감정, 필터 선택지)"""
+    response = requests.get(f"{RESULTS_URL}{task_id}/summary", timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+def fetch_relations_page(task_id, params, page):
+    """서버에서 관계 한 페이지만 받아 (표, 페이지 번호, 페이지 정보) 반환 (범위를 넘으면 마지막 페이지)"""
+    page = max(1, int(page))
+    query = dict(params, offset=(page - 1) * RELATIONS_PAGE_SIZE, limit=RELATIONS_PAGE_SIZE)
+    response = requests.get(f"{RESULTS_URL}{task_id}/relations", params=query, timeout=30)
+    response.raise_for_status()
+    data = response.json()
+    pages = max(1, -(-data["total"] // RELATIONS_PAGE_SIZE))
+    if page > pages:
+        return fetch_relations_page(task_id, params, pages)
+    df = pd.DataFrame(data["rows"], columns=RELATION_COLUMNS)
+    return df, page, f"{page}/{pages} 페이지 (관계 {data['total']}개)"
+
+def query_relations(task_id, source, target, attitude, chapter, sort, descending, page):
+    """필터·정렬을 바꾸거나 페이지를 넘길 때 그 페이지만 다시 조회"""
+    if not task_id:
+        return None, 1, "분석 결과가 없습니다."
+    try:
+        return fetch_relations_page(task_id, _relation_filters(source, target, attitude, chapter, sort, descending), page or 1)
+    except requests.exceptions.RequestException as e:
+        return gr.update(), page, f"❌ 조회 실패: {str(e)}"
+
+def relations_page_handler(delta):
+    """이전/다음 페이지 버튼용 핸들러"""
+    def handler(task_id, source, target, attitude, chapter, sort, descending, page):
+        return query_relations(task_id, source, target, attitude, chapter, sort, descending, (page or 1) + delta)
+    return handler
+
+def _progress_outputs(progress, status_message):
+    """진행 상황만 갱신하고 결과 영역은 그대로 두는 출력"""
+    return (gr.update(), gr.update(), gr.update(), gr.update(), gr.update(),
+            gr.update(value=progress), gr.update(value=status_message), gr.update(visible=True),
+            *(gr.update() for _ in range(7)))
+
+def _filter_choices(values):
+    return gr.update(choices=[("전체", "")] + [(value, value) for value in dict.fromkeys(values)], value="")
+
+def _result_outputs(df, message, graph_html, chapter_df, progress=None, query=None):
+    """결과 영역 출력 (progress가 주어지면 진행 막대도, query가 주어지면 조회 필터도 갱신)
+
+    query: (작업 ID, 결과 요약, 페이지 정보)
+    """
+    progress_update = gr.update(value=progress) if progress is not None else gr.update()
+    if query is None:
+        query_updates = tuple(gr.update() for _ in range(7))
+    else:
+        task_id, summary, page_info = query
+        query_updates = (task_id, _filter_choices(summary["characters"]), _filter_choices(summary["characters"]),
+                         _filter_choices(summary["emotions"]), _filter_choices(summary["chapters"]), 1, page_info)
+    return (df, message, None, graph_html, chapter_df,
+            progress_update, gr.update(value=message), gr.update(), *query_updates)
+
+def _graph_outputs(graph_html):
+    """관계 그래프만 갱신하는 출력"""
+    outputs = [gr.update() for _ in range(15)]
+    outputs[3] = graph_html
+    return tuple(outputs)
+
+async def analyze_text(text, characters_str, emotion_lex_json, chapter_pattern, sentence_window=1):
+    """텍스트 분석을 실행하고 진행 상황과 결과를 차례로 내보냄 (Gradio 비동기 제너레이터)"""
+    if not text or not text.strip():
+        yield _result_outputs(None, "❌ 텍스트가 비어있습니다.", None, None)
+        return
+    async for outputs in _analyze_source(lambda: _text_source(text), characters_str, emotion_lex_json,
+                                         chapter_pattern, sentence_window):
+        yield outputs
+
+async def _analyze_source(load_source, characters_str, emotion_lex_json, chapter_pattern, sentence_window):
+    """load_source()가 돌려준 본문 (read_from, 바이트 수, 해시)를 올리고 분석 결과를 차례로 내보냄
+
+    진행 상황 구독과 그래프 대기는 이벤트 루프에서 기다리고, 본문 읽기와 짧은 동기 요청만 스레드로 넘긴다.
+    """
     try:
-        if not text or not text.strip():
-            return None, "❌ 텍스트가 비어있습니다.", None, None, None
-            
         characters = [c.strip() for c in characters_str.split(",") if c.strip()]
         if not characters:
-            return None, "❌ 등장인물이 비어있습니다.", None, None, None
+            yield _result_outputs(None, "❌ 등장인물이 비어있습니다.", None, None)
+            return
             
         try:
             emotion_lexicon = json.loads(emotion_lex_json)
         except json.JSONDecodeError:
-            return None, "❌ 감정어 사전 JSON 형식이 올바르지 않습니다.", None, None, None
+            yield _result_outputs(None, "❌ 감정어 사전 JSON 형식이 올바르지 않습니다.", None, None)
+            return
             
-        # 텍스트 크기 계산
-        text_size_mb = len(text) / (1024 * 1024)
-        status_text.update(value=f"📤 텍스트 전송 중... ({text_size_mb:.2f}MB)")
-        progress_container.update(visible=True)
+        # 본문은 해시로 식별해 서버에 없을 때만 압축 청크로 올리고, 분석 요청에는 해시만 보낸다
+        try:
+            read_from, size, text_hash = await asyncio.to_thread(load_source)
+        except UnicodeError as e:
+            yield _result_outputs(None, f"❌ 파일 인코딩을 인식할 수 없습니다: {str(e)}", None, None)
+            return
+        if not size:
+            yield _result_outputs(None, "❌ 텍스트가 비어있습니다.", None, None)
+            return
+        yield _progress_outputs(0, f"📤 본문 확인 중... ({size / (1024 * 1024):.2f}MB)")
+        uploaded = False
+        uploads = upload_text(read_from, size, text_hash)
+        while (step := await asyncio.to_thread(next, uploads, None)) is not None:
+            sent, total = step
+            uploaded = True
+            yield _progress_outputs(0, f"📤 본문 업로드 중... ({sent / (1024 * 1024):.1f}/{total / (1024 * 1024):.1f}MB)")
+        if not uploaded:
+            yield _progress_outputs(0, "📤 서버에 같은 본문이 있어 업로드를 건너뜁니다.")
         
         payload = {
-            "text": text,
+            "text_hash": text_hash,
             "characters": characters,
             "emotion_lexicon": emotion_lexicon,
-            "chapter_pattern": chapter_pattern
+            "chapter_pattern": chapter_pattern,
+            "sentence_window": int(sentence_window)
         }
         
         # API 요청 보내기
-        response = requests.post(API_URL, json=payload, timeout=30)
+        response = await asyncio.to_thread(requests.post, API_URL, json=payload, timeout=30)
+        if response.status_code in (404, 413, 503):
+            # 서버 대기열이 가득 찼거나 업로드한 본문이 저장소에서 지워진 경우
+            yield _result_outputs(None, f"❌ {response.json().get('detail', response.status_code)}", None, None)
+            return
         response_data = response.json()
         
         # 대용량 텍스트인 경우 백그라운드 작업 처리
         if "task_id" in response_data:
             task_id = response_data["task_id"]
-            status_text.update(value=f"🔄 백그라운드 작업 시작됨 (ID: {task_id})")
-            
-            # 상태 확인 스레드 시작
-            thread = Thread(target=poll_task_status, args=(task_id, progress_bar, status_text))
-            thread.daemon = True
-            thread.start()
-            
-            # 폴링 중에 UI 차단 방지
-            time.sleep(2)
-            
-            # 결과 준비 이벤트
-            result_ready = Event()
+            yield _progress_outputs(0, f"🔄 백그라운드 작업 시작됨 (ID: {task_id})")
             
-            # 상태 확인 스레드 업데이트
-            thread = Thread(target=poll_task_status, args=(task_id, progress_bar, status_text, result_ready))
-            thread.daemon = True
-            thread.start()
+            # 작업당 한 번 구독하고, 서버가 보내는 진행 상황을 그대로 화면에 반영
+            status_data = response_data
+            try:
+                async for status_data in stream_task_events(task_id):
+                    status = status_data.get("status")
+                    yield _progress_outputs(status_data.get("progress", 0),
+                                            f"상태: {status} - {status_data.get('message', '진행 중...')}")
+            except httpx.HTTPError:
+                # 스트림이 끊기면 마지막 상태를 한 번 조회
+                status_response = await asyncio.to_thread(requests.get, f"{TASKS_URL}{task_id}", timeout=30)
+                if status_response.status_code != 200:
+                    yield _result_outputs(None, f"❌ 상태 확인 실패: {status_response.status_code}", None, None)
+                    return
+                status_data = status_response.json()
             
-            # 작업 완료 대기 (타임아웃 추가)
-            max_wait_time = 7200  # 최대 2시간 대기
-            result_ready.wait(timeout=max_wait_time)
+            if status_data["status"] == "completed":
+                # 관계 전체 대신 요약과 첫 페이지만 가져온다 (나머지는 페이지 이동 시 조회)
+                try:
+                    summary = await asyncio.to_thread(fetch_result_summary, task_id)
+                    df, _, page_info = await asyncio.to_thread(fetch_relations_page, task_id, _relation_filters(), 1)
+                except requests.exceptions.HTTPError as e:
+                    yield _result_outputs(None, f"❌ 결과 획득 실패: {e.response.status_code}", None, None)
+                    return
+            elif status_data["status"] in ("failed", "cancelled"):
+                yield _result_outputs(None, f"❌ 작업 실패: {status_data.get('message', '알 수 없는 오류')}", None, None)
+                return
+            else:
+                yield _result_outputs(None, f"❌ 작업 상태 스트림이 완료 전에 끊어졌습니다. (상태: {status_data['status']})", None, None)
+                return
+        else:
+            yield _result_outputs(None, "❌ 서버 응답에 작업 ID가 없습니다.", None, None)
+            return
             
-            # 결과 가져오기
+        # 그래프는 렌더링 스레드에서 그리고, 그동안 표와 챕터별 감정을 먼저 보여 준다
+        graph_future = render_graph_async(summary["summary_relations"]) if summary.get("relations_count") else None
+        yield _result_outputs(*render_result(summary, df), progress=100, query=(task_id, summary, page_info))
+        if graph_future is not None:
             try:
-                status_response = requests.get(f"{TASKS_URL}{task_id}")
-                if status_response.status_code == 200:
-                    status_data = status_response.json()
-                    if status_data["status"] == "completed":
-                        # 완료된 결과 가져오기
-                        result_response = requests.get(f"{RESULTS_URL}{task_id}")
-                        if result_response.status_code == 200:
-                            result = result_response.json()
-                        else:
-                            return None, f"❌ 결과 획득 실패: {result_response.status_code}", None, None, None
-                    elif status_data["status"] == "failed":
-                        return None, f"❌ 작업 실패: {status_data.get('message', '알 수 없는 오류')}", None, None, None
-                    else:
-                        return None, f"❌ 시간 초과: 작업이 {max_wait_time}초 내에 완료되지 않았습니다.", None, None, None
-                else:
-                    return None, f"❌ 상태 확인 실패: {status_response.status_code}", None, None, None
+                graph_html = await asyncio.wait_for(asyncio.wrap_future(graph_future), GRAPH_RENDER_TIMEOUT)
+                yield _graph_outputs(graph_html)
             except Exception as e:
-                return None, f"❌ 상태 확인 중 오류: {str(e)}", None, None, None
-        else:
-            # 일반 동기 응답 처리
-            result = response_data
-            
-        # 분석 결과 처리
-        relations = result.get("relations", [])
-        summary_relations = result.get("summary_relations", [])
-        chapter_emotions = result.get("chapter_emotions", {})
-        
-        if not relations:
-            return None, "⚠️ 관계 데이터가 없습니다.", None, None, None
-        
-        df = pd.DataFrame(relations)
-        csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, index=False, encoding="utf-8-sig")
-        csv_data = csv_buffer.getvalue()
-        
-        # 요약 관계로 그래프 그리기
-        graph_path = None
+                print(f"그래프 생성 중 오류: {str(e)}")
+                yield _graph_outputs(f"<p>❌ 그래프 생성 실패: {str(e)}</p>")
+    
+    except (requests.exceptions.RequestException, httpx.HTTPError) as e:
+        yield _result_outputs(None, f"❌ API 서버 통신 오류: {str(e)}", None, None)
+    except Exception as e:
+        yield _result_outputs(None, f"❌ 예외 발생: {str(e)}", None, None)
+
+# === 관계 그래프 렌더링 ===
+# pyplot 전역 상태를 쓰지 않고 Figure 객체만 사용하므로 여러 사용자가 동시에 그려도 안전하다
+GRAPH_PENDING_HTML = "<p>🔄 관계 그래프 생성 중...</p>"
+_graph_executor = ThreadPoolExecutor(max_workers=GRAPH_RENDER_WORKERS, thread_name_prefix="graph-render")
+_layout_cache = OrderedDict()  # 그래프 구조 해시 -> 노드 위치
+_render_cache = OrderedDict()  # 요약 관계 해시 -> 그래프 HTML
+_graph_cache_lock = threading.Lock()
+
+def _cache_get(cache, key):
+    with _graph_cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+def _cache_put(cache, key, value):
+    with _graph_cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > GRAPH_CACHE_SIZE:
+            cache.popitem(last=False)
+
+def _content_key(value):
+    return hashlib.sha256(json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+def graph_layout(G):
+    """노드·엣지 구조별로 캐시한 레이아웃 (가중치나 레이블만 바뀌면 다시 계산하지 않음)"""
+    key = _content_key([sorted(G.nodes()), sorted(G.edges())])
+    pos = _cache_get(_layout_cache, key)
+    if pos is not None:
+        return pos
+    # 노드 수에 따른 최적 레이아웃 선택 (가중치와 무관하게 구조만으로 배치)
+    pos = None
+    if G.number_of_nodes() < 10:
+        pos = nx.spring_layout(G, seed=42, k=0.5, weight=None)  # 스프링 레이아웃 (적은 노드용)
+    elif G.number_of_nodes() < 20:
         try:
-            fig, ax = plt.subplots(figsize=(10, 10))
-            G = nx.DiGraph()
-            
-            for rel in summary_relations:
-                src = rel["from"]
-                tgt = rel["to"]
-                label = rel["attitude"]
-                count = rel["count"]
-                G.add_edge(src, tgt, label=f"{label} ({count})", weight=count)
-        
-            if G.number_of_nodes() > 0:  # 노드가 있을 때만 그래프 그리기
-                # 노드 수에 따른 최적 레이아웃 선택
-                if G.number_of_nodes() < 10:
-                    pos = nx.spring_layout(G, seed=42, k=0.5)  # 스프링 레이아웃 (적은 노드용)
-                elif G.number_of_nodes() < 20:
-                    pos = nx.kamada_kawai_layout(G)  # Kamada-Kawai (중간 노드용)
-                else:
-                    pos = nx.fruchterman_reingold_layout(G, seed=42)  # Fruchterman-Reingold (많은 노드용)
-                
-                # 노드 색상 및 크기 조정
-                node_sizes = [2000 + G.degree(n) * 200 for n in G.nodes()]
-                nx.draw(G, pos, with_labels=True, 
-                       node_color="lightgreen", 
-                       edge_color="gray",
-                       node_size=node_sizes,
-                       font_size=10, 
-                       font_weight='bold',
-                       ax=ax)
-                
-                # 엣지 레이블 추가
-                edge_labels = nx.get_edge_attributes(G, "label")
-                nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, ax=ax)
-                
-                plt.tight_layout()
-                
-                # 임시 파일에 저장 (중복 방지)
-                timestamp = int(time.time())
-                graph_path = f"graph_{timestamp}.png"
-                plt.savefig(graph_path, dpi=300, bbox_inches='tight')
-                plt.close()
-        except Exception as e:
-            print(f"그래프 생성 중 오류: {str(e)}")
-            graph_path = None
+            pos = nx.kamada_kawai_layout(G, weight=None)  # Kamada-Kawai (중간 노드용)
+        except ImportError:
+            pass  # scipy가 없으면 아래 레이아웃 사용
+    if pos is None:
+        pos = nx.fruchterman_reingold_layout(G, seed=42, weight=None)  # Fruchterman-Reingold (많은 노드용)
+    _cache_put(_layout_cache, key, pos)
+    return pos
+
+def render_graph_html(summary_relations):
+    """요약 관계를 SVG 관계 그래프(HTML)로 그림 (같은 요약이면 캐시된 결과)"""
+    if not summary_relations:
+        return "<p>⚠️ 그래프로 표시할 관계가 없습니다.</p>"
+    key = _content_key(summary_relations)
+    html = _cache_get(_render_cache, key)
+    if html is not None:
+        return html
+    
+    G = nx.DiGraph()
+    for rel in summary_relations:
+        G.add_edge(rel["from"], rel["to"], label=f"{rel['attitude']} ({rel['count']})", weight=rel["count"])
+    pos = graph_layout(G)
+    
+    # 노드 수에 맞춰 그림 크기를 키우고 노드·글자 크기는 줄인다
+    node_count = G.number_of_nodes()
+    side = min(GRAPH_MAX_INCHES, max(10, 2.5 * math.sqrt(node_count)))
+    small = node_count >= 50
+    detailed = G.number_of_edges() <= GRAPH_LABEL_EDGE_LIMIT
+    max_weight = max(weight for _, _, weight in G.edges(data="weight"))
+    
+    fig = Figure(figsize=(side, side))
+    ax = fig.add_subplot()
+    ax.set_axis_off()
+    node_sizes = [(300 + G.degree(n) * 30) if small else (2000 + G.degree(n) * 200) for n in G.nodes()]
+    nx.draw_networkx(G, pos, ax=ax, with_labels=True,
+                     node_color="lightgreen",
+                     edge_color="gray",
+                     node_size=node_sizes,
+                     width=[0.5 + 2.5 * weight / max_weight for _, _, weight in G.edges(data="weight")],
+                     arrows=detailed,
+                     font_size=7 if small else 10,
+                     font_weight='bold')
+    if detailed:
+        # 엣지 레이블 추가 (엣지가 많으면 생략하고 선 굵기로만 표시)
+        edge_labels = nx.get_edge_attributes(G, "label")
+        nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, ax=ax, font_size=6 if small else 8)
+    fig.tight_layout()
+    
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="svg", bbox_inches="tight")
+    svg = buffer.getvalue().decode("utf-8")
+    svg = svg[svg.index("<svg"):]  # XML 선언 제거
+    html = f'<div style="overflow:auto; max-height:900px">{svg}</div>'
+    _cache_put(_render_cache, key, html)
+    return html
+
+def render_graph_async(summary_relations):
+    """그래프를 렌더링 스레드에서 그리도록 맡기고 Future 반환 (표는 먼저 표시)"""
+    return _graph_executor.submit(render_graph_html, summary_relations)
+
+def render_result(summary, df):
+    """결과 요약과 관계 표 첫 페이지로 (관계 표, 메시지, 그래프 자리, 챕터별 감정 표) 생성
+
+    그래프는 render_graph_async로 따로 그린 뒤 채운다.
+    """
+    try:
+        # 분석 결과 처리
+        matrix = summary.get("chapter_emotion_matrix")
         
-        # 챕터별 감정 테이블 생성
-        chapter_emotion_rows = []
-        for chapter, emotions in chapter_emotions.items():
-            row = {"chapter": chapter}
-            row.update(emotions)
-            chapter_emotion_rows.append(row)
+        if not summary.get("relations_count"):
+            return None, "⚠️ 관계 데이터가 없습니다.", None, None
         
-        if chapter_emotion_rows:
-            chapter_df = pd.DataFrame(chapter_emotion_rows)
+        # 챕터별 감정 테이블 생성 (서버가 만든 챕터×감정 행렬 + 긍정/부정 흐름)
+        if matrix and matrix["chapters"]:
+            chapter_df = pd.DataFrame(matrix["counts"], columns=matrix["emotions"])
+            chapter_df = chapter_df.loc[:, chapter_df.sum() > 0]
+            chapter_df.insert(0, "chapter", matrix["chapters"])
+            balance = summary.get("emotion_balance", [])
+            if balance:
+                balance_df = pd.DataFrame(balance).drop(columns="chapter")
+                chapter_df = pd.concat([chapter_df, balance_df], axis=1)
         else:
             chapter_df = None
         
-        return df, "✅ 분석 성공!", csv_data, graph_path, chapter_df
-    
-    except requests.exceptions.RequestException as e:
-        return None, f"❌ API 서버 통신 오류: {str(e)}", None, None, None
+        return df, f"✅ 분석 성공! (관계 {summary['relations_count']}개)", GRAPH_PENDING_HTML, chapter_df
     except Exception as e:
-        return None, f"❌ 예외 발생: {str(e)}", None, None, None
+        return None, f"❌ 결과 처리 중 예외 발생: {str(e)}", None, None
 
-def download_csv_file(csv_str):
-    """CSV 파일 저장"""
-    if not csv_str:
+def download_csv_file(task_id, source, target, attitude, chapter, sort, descending):
+    """현재 필터·정렬의 관계 전체를 서버에서 CSV로 스트리밍 받아 파일로 저장"""
+    if not task_id:
         return None
     
     try:
-        timestamp = int(time.time())
-        filename = f"relations_output_{timestamp}.csv"
-        with open(filename, "w", encoding="utf-8-sig") as f:
-            f.write(csv_str)
-        return filename
+        params = _relation_filters(source, target, attitude, chapter, sort, descending)
+        with requests.get(f"{RESULTS_URL}{task_id}/relations.csv", params=params, stream=True, timeout=(10, 300)) as response:
+            response.raise_for_status()
+            return save_output_file(response.iter_content(chunk_size=1024 * 1024), "relations", ".csv")
     except Exception as e:
         print(f"CSV 저장 중 오류: {str(e)}")
         return None
 
-def process_large_text_file(file_obj, chars, lex, pat, progress_bar, status_text, progress_container):
-    """대용량 텍스트 파일 처리"""
-    status_msg, text_content = upload_file_to_text(file_obj)
+def download_result_file(task_id):
+    """열 기반 결과 파일(.rel)을 받아 저장 (노트북에서 core_analysis.load_relations_file로 메모리 맵)"""
+    if not task_id:
+        return None
     
-    if text_content is None:
-        return None, status_msg, None, None, None
+    try:
+        with requests.get(f"{RESULTS_URL}{task_id}/relations.rel", stream=True, timeout=(10, 300)) as response:
+            response.raise_for_status()
+            return save_output_file(response.iter_content(chunk_size=1024 * 1024), "relations", ".rel")
+    except Exception as e:
+        print(f"결과 파일 저장 중 오류: {str(e)}")
+        return None
+
+async def process_large_text_file(file_obj, chars, lex, pat, window=1):
+    """대용량 텍스트 파일 처리 (파일은 문자열로 읽지 않고 UTF-8 블록 단위로 해시·업로드)"""
+    if file_obj is None:
+        yield _result_outputs(None, "❌ 분석할 파일을 선택해 주세요.", None, None)
+        return
+    if isinstance(file_obj, bytes):
+        # 이미 메모리에 있는 업로드는 텍스트 분석과 같은 경로
+        status_msg, text_content = await asyncio.to_thread(upload_file_to_text, file_obj)
+        if text_content is None:
+            yield _result_outputs(None, status_msg, None, None)
+            return
+        source = lambda: _text_source(text_content)
+    else:
+        # gr.File은 업로드된 임시 파일 경로(또는 name 속성을 가진 객체)를 넘긴다
+        path = file_obj if isinstance(file_obj, str) else file_obj.name
+        source = lambda: _path_source(path)
     
     # 일반 텍스트 분석과 동일한 프로세스 수행
-    return analyze_text(text_content, chars, lex, pat, progress_bar, status_text, progress_container)
+    async for outputs in _analyze_source(source, chars, lex, pat, window):
+        yield outputs
 
 # 샘플 감정어 사전
 DEFAULT_EMOTION_LEXICON = {
@@ -298,6 +632,11 @@ if __name__ == "__main__":
             placeholder="예: (Letter \\d+|Chapter \\d+)"
         )
         
+        sentence_window_input = gr.Slider(
+            minimum=1, maximum=10, step=1, value=1,
+            label="문장 창 크기 (연속한 몇 문장 안에서 관계를 찾을지, 1이면 같은 문장 안에서만)"
+        )
+        
         with gr.Row():
             analyze_button = gr.Button("텍스트 분석 시작", variant="primary")
             analyze_file_button = gr.Button("파일 분석 시작", variant="primary")
@@ -312,12 +651,28 @@ if __name__ == "__main__":
             
             with gr.Row():
                 with gr.Column():
+                    task_state = gr.State(None)
+                    with gr.Row():
+                        from_filter = gr.Dropdown(label="보낸 인물", choices=[("전체", "")], value="")
+                        to_filter = gr.Dropdown(label="받는 인물", choices=[("전체", "")], value="")
+                        attitude_filter = gr.Dropdown(label="감정", choices=[("전체", "")], value="")
+                        chapter_filter = gr.Dropdown(label="챕터", choices=[("전체", "")], value="")
+                    with gr.Row():
+                        sort_input = gr.Dropdown(label="정렬", choices=RELATION_SORT_CHOICES, value="order")
+                        descending_input = gr.Checkbox(label="내림차순", value=False)
                     relations_df = gr.DataFrame(label="관계 데이터")
-                    csv_download_button = gr.Button("CSV 파일로 다운로드")
+                    with gr.Row():
+                        prev_page_button = gr.Button("◀ 이전")
+                        page_number = gr.Number(label="페이지", value=1, precision=0, minimum=1)
+                        next_page_button = gr.Button("다음 ▶")
+                    page_info = gr.Textbox(label="페이지 정보", interactive=False)
+                    with gr.Row():
+                        csv_download_button = gr.Button("CSV 파일로 다운로드")
+                        result_download_button = gr.Button("열 기반 결과 파일(.rel) 다운로드")
                     download_path = gr.File(label="다운로드된 파일")
                 
                 with gr.Column():
-                    graph_output = gr.Image(label="관계 그래프", type="filepath")
+                    graph_output = gr.HTML(label="관계 그래프")
         
         with gr.Tab("감정 분석"):
             emotion_df = gr.DataFrame(label="챕터별 감정 분포")
@@ -329,23 +684,40 @@ if __name__ == "__main__":
             outputs=[file_status, text_input]
         )
         
+        analysis_outputs = [relations_df, result_text, download_path, graph_output, emotion_df,
+                            progress_bar, status_text, progress_container,
+                            task_state, from_filter, to_filter, attitude_filter, chapter_filter, page_number, page_info]
+        query_inputs = [task_state, from_filter, to_filter, attitude_filter, chapter_filter, sort_input, descending_input]
+        page_outputs = [relations_df, page_number, page_info]
+        
         analyze_button.click(
             fn=analyze_text,
-            inputs=[text_input, characters_input, emotion_lexicon_input, 
-                   chapter_pattern_input, progress_bar, status_text, progress_container],
-            outputs=[relations_df, result_text, download_path, graph_output, emotion_df]
+            inputs=[text_input, characters_input, emotion_lexicon_input, chapter_pattern_input, sentence_window_input],
+            outputs=analysis_outputs
         )
         
         analyze_file_button.click(
             fn=process_large_text_file,
-            inputs=[file_input, characters_input, emotion_lexicon_input, 
-                   chapter_pattern_input, progress_bar, status_text, progress_container],
-            outputs=[relations_df, result_text, download_path, graph_output, emotion_df]
+            inputs=[file_input, characters_input, emotion_lexicon_input, chapter_pattern_input, sentence_window_input],
+            outputs=analysis_outputs
         )
         
+        # 필터·정렬을 바꾸면 첫 페이지부터, 페이지 이동은 해당 페이지만 서버에서 조회
+        for control in (from_filter, to_filter, attitude_filter, chapter_filter, sort_input, descending_input):
+            control.input(fn=relations_page_handler(0), inputs=query_inputs + [gr.State(1)], outputs=page_outputs)
+        page_number.submit(fn=query_relations, inputs=query_inputs + [page_number], outputs=page_outputs)
+        prev_page_button.click(fn=relations_page_handler(-1), inputs=query_inputs + [page_number], outputs=page_outputs)
+        next_page_button.click(fn=relations_page_handler(1), inputs=query_inputs + [page_number], outputs=page_outputs)
+        
         csv_download_button.click(
             fn=download_csv_file,
-            inputs=[download_path],
+            inputs=query_inputs,
+            outputs=[download_path]
+        )
+        
+        result_download_button.click(
+            fn=download_result_file,
+            inputs=[task_state],
             outputs=[download_path]
         )
     